@@ -0,0 +1,142 @@
+# Banc de contention des places : de nombreux clients réservent en même temps les places
+# d'une même séance populaire, jusqu'à ce qu'elle soit complète.
+#
+# Pour chaque niveau de concurrence, chaque thread réserve une place à la fois jusqu'à
+# recevoir un refus ; on vérifie ensuite qu'il n'y a jamais de survente (réservations
+# acceptées == capacité, aucune place restante) et, en mode local, que le journal
+# rejoué redonne les mêmes compteurs. Le débit (réservations/s) montre comment la
+# contention sur un même compteur évolue avec le nombre de clients ; avec --screenings k,
+# les threads se répartissent sur k séances (verrous de séances différentes).
+#
+#   python benchmarks/contention.py [--threads 1,8,32,128,256] [--capacity 5000] [--screenings 1]
+#
+# Par défaut les compteurs JsonSeats du mode JSON sont testés dans le processus, avec un
+# journal temporaire (--fsync group|interval|never). Avec --url, les réservations sont
+# envoyées au service Schedule lancé (JSON ou MongoDB) via POST /schedule/seats/reserve :
+#
+#   python benchmarks/contention.py --url http://localhost:3202 --capacity 500
+
+import argparse
+import json
+import os
+import sys
+import tempfile
+import threading
+import time
+
+import requests
+
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+sys.path.append(os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "schedule"))
+from common.journal import FSYNC_POLICIES, Journal
+from seats import JsonSeats
+
+DATE = "20991231"
+
+
+def hammer(threads, screenings, reserve):
+    # Lance `threads` clients qui réservent chacun une place à la fois sur leur séance
+    # jusqu'au premier refus ; renvoie (réservations acceptées par séance, durée)
+    accepted = [[0] * threads for _ in range(len(screenings))]
+    barrier = threading.Barrier(threads)
+
+    def client(worker):
+        screening = worker % len(screenings)
+        movieid = screenings[screening]
+        barrier.wait()
+        while reserve(movieid):
+            accepted[screening][worker] += 1
+
+    clients = [threading.Thread(target=client, args=(worker,)) for worker in range(threads)]
+    started = time.perf_counter()
+    for thread in clients:
+        thread.start()
+    for thread in clients:
+        thread.join()
+    return [sum(counts) for counts in accepted], time.perf_counter() - started
+
+
+def run_local(threads, capacity, movie_ids, fsync):
+    directory = tempfile.mkdtemp(prefix="contention_")
+    snapshot_path = os.path.join(directory, "seats.json")
+    with open(snapshot_path, "w") as jsf:
+        json.dump({"seats": []}, jsf)
+
+    seats = JsonSeats()
+    seats.open(Journal(snapshot_path, "seats", "screening", fsync=fsync))
+    for movieid in movie_ids:
+        seats.set_capacity(movieid, DATE, capacity)
+
+    accepted, elapsed = hammer(threads, movie_ids, lambda movieid: seats.reserve(movieid, DATE, 1) is not None)
+
+    errors = []
+    for movieid, count in zip(movie_ids, accepted):
+        available = seats.get(movieid, DATE)["available"]
+        if count != capacity or available != 0:
+            errors.append(f"{movieid} : {count} réservations acceptées pour {capacity} places, {available} restantes")
+
+    if seats.journal.compaction_thread is not None:
+        seats.journal.compaction_thread.join()
+    seats.journal.close()
+    replayed = JsonSeats()
+    replayed.open(Journal(snapshot_path, "seats", "screening"))
+    if replayed.counters != seats.counters:
+        errors.append("compteurs rejoués depuis le journal différents des compteurs en mémoire")
+    return sum(accepted), elapsed, errors
+
+
+def run_http(url, threads, capacity, movie_ids):
+    for movieid in movie_ids:
+        requests.delete(f"{url}/schedule/{movieid}/{DATE}")
+        requests.post(f"{url}/schedule", json={"movieid": movieid, "date": DATE}).raise_for_status()
+        requests.put(f"{url}/schedule/{movieid}/{DATE}/seats", json={"capacity": capacity}).raise_for_status()
+
+    session_local = threading.local()
+
+    def reserve(movieid):
+        if not hasattr(session_local, "session"):
+            session_local.session = requests.Session()
+        response = session_local.session.post(
+            f"{url}/schedule/seats/reserve", json={"items": [{"movieid": movieid, "date": DATE}]}
+        )
+        return response.status_code == 200 and response.json()["results"][0]["status"] == 200
+
+    accepted, elapsed = hammer(threads, movie_ids, reserve)
+
+    errors = []
+    for movieid, count in zip(movie_ids, accepted):
+        available = requests.get(f"{url}/schedule/{movieid}/{DATE}/seats").json()["available"]
+        if count != capacity or available != 0:
+            errors.append(f"{movieid} : {count} réservations acceptées pour {capacity} places, {available} restantes")
+        requests.delete(f"{url}/schedule/{movieid}/{DATE}")
+    return sum(accepted), elapsed, errors
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Banc de contention des réservations de places")
+    parser.add_argument("--threads", default="1,8,32,128,256", help="niveaux de concurrence, séparés par des virgules")
+    parser.add_argument("--capacity", type=int, default=5000, help="places par séance")
+    parser.add_argument("--screenings", type=int, default=1, help="nombre de séances se partageant les threads")
+    parser.add_argument("--fsync", default="group", choices=FSYNC_POLICIES, help="mode fsync du journal (test local)")
+    parser.add_argument("--url", help="URL du service Schedule à tester par HTTP")
+    args = parser.parse_args()
+
+    movie_ids = [f"contention_movie_{i}" for i in range(args.screenings)]
+    errors = []
+    print(f"{'threads':>8} {'réservations':>13} {'durée (s)':>10} {'réservations/s':>15}")
+    for threads in (int(level) for level in args.threads.split(",")):
+        if args.url:
+            accepted, elapsed, level_errors = run_http(args.url.rstrip("/"), threads, args.capacity, movie_ids)
+        else:
+            accepted, elapsed, level_errors = run_local(threads, args.capacity, movie_ids, args.fsync)
+        print(f"{threads:>8} {accepted:>13} {elapsed:>10.2f} {accepted / elapsed:>15.0f}")
+        errors.extend(f"{threads} threads, {error}" for error in level_errors)
+
+    for error in errors[:20]:
+        print(f"ÉCHEC : {error}")
+    print("OK" if not errors else f"{len(errors)} violations d'invariants")
+    return 1 if errors else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
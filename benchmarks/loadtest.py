@@ -0,0 +1,438 @@
+# Banc de charge des quatre services.
+#
+# Pour chaque combinaison (persistance, échelle), le banc génère un jeu de données
+# synthétique (films, horaires, utilisateurs, réservations), lance User, Movie,
+# Schedule et Booking avec gunicorn dans un répertoire temporaire, attend /readyz,
+# puis envoie une charge mixte depuis plusieurs threads :
+#
+#   create    POST /bookings
+#   detailed  GET  /bookings/<userid>/detailed
+#   title     GET  /moviesbytitle?title=...
+#   listing   GET  /json, /schedule, /bookings?userid=<admin> (tour à tour)
+#
+# Les séances ont une capacité de BENCH_SCREENING_CAPACITY places, pour que les créations
+# ne soient pas refusées faute de place ; les refus (409 : déjà réservé, complet) sont
+# comptés à part des erreurs (5xx, échec de connexion).
+#
+# Les latences p50/p95/p99 et le débit sont rapportés par route, et écrits en JSON
+# (--output) pour être comparés entre deux commits (--baseline) :
+#
+#   python benchmarks/loadtest.py --persistence json --scale 1000 100000 --output results.json
+#   python benchmarks/loadtest.py --persistence mongodb --scale 1000 --baseline results.json
+#
+# En mode MongoDB, un mongod local est lancé dans un répertoire temporaire (--mongod),
+# sauf si --mongo-url est donné ; les bases d'une instance existante ne sont vidées
+# qu'avec --drop. --external envoie la charge à des services déjà lancés.
+
+import argparse
+import json
+import os
+import random
+import shutil
+import socket
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+from collections import defaultdict
+from datetime import date, timedelta
+
+import requests
+from pymongo import MongoClient
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+SERVICES = ["user", "movie", "schedule", "booking"]
+# Décalage de port de chaque service par rapport à --base-port (ports par défaut 3200-3203)
+PORT_OFFSETS = {"movie": 0, "booking": 1, "schedule": 2, "user": 3}
+DATABASE_FILES = {"user": "users.json", "movie": "movies.json", "schedule": "times.json", "booking": "bookings.json"}
+MONGO_DATABASES = ["users", "movies", "schedule", "bookings"]
+DEFAULT_WEIGHTS = "create=2,detailed=3,title=3,listing=1"
+ADMIN_ID = "bench_admin"
+DATES = 30
+MOVIES_PER_DATE = 50
+BENCH_SCREENING_CAPACITY = 1_000_000
+
+
+# ============================================================================
+# JEU DE DONNÉES SYNTHÉTIQUE
+# ============================================================================
+
+def generate_dataset(scale, seed=0):
+    # Jeu de données de `scale` réservations : scale/10 utilisateurs, ~√scale films,
+    # DATES dates programmant chacune jusqu'à MOVIES_PER_DATE films
+    rng = random.Random(seed)
+    users = [{"id": ADMIN_ID, "name": "Bench Admin", "role": "admin", "last_active": 0}]
+    users += [{"id": f"user_{i}", "name": f"User {i}", "role": "user", "last_active": 0} for i in range(max(10, scale // 10))]
+    movies = [
+        {"id": f"movie_{i}", "title": f"Movie {i}", "rating": round(rng.uniform(1, 10), 1), "director": f"Director {i % 97}"}
+        for i in range(max(20, int(scale ** 0.5)))
+    ]
+    first = date(2030, 1, 1)
+    schedule = []
+    for day in range(DATES):
+        picked = rng.sample(movies, min(MOVIES_PER_DATE, len(movies)))
+        schedule.append({"date": (first + timedelta(days=day)).strftime("%Y%m%d"), "movies": [movie["id"] for movie in picked]})
+    screenings = [(movieid, entry["date"]) for entry in schedule for movieid in entry["movies"]]
+
+    history = defaultdict(lambda: defaultdict(set))
+    for _ in range(scale):
+        user = rng.choice(users[1:])
+        movieid, day = rng.choice(screenings)
+        history[user["id"]][day].add(movieid)
+    bookings = [
+        {"userid": userid, "dates": [{"date": day, "movies": sorted(movies)} for day, movies in sorted(dates.items())]}
+        for userid, dates in history.items()
+    ]
+    return {"users": users, "movies": movies, "schedule": schedule, "bookings": bookings, "screenings": screenings}
+
+
+def write_dataset(workdir, dataset):
+    for service, filename in DATABASE_FILES.items():
+        key = {"user": "users", "movie": "movies", "schedule": "schedule", "booking": "bookings"}[service]
+        with open(os.path.join(workdir, service, "databases", filename), "w") as jsf:
+            json.dump({key: dataset[key]}, jsf)
+
+
+# ============================================================================
+# LANCEMENT DES SERVICES
+# ============================================================================
+
+def free_port():
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        return sock.getsockname()[1]
+
+
+def start_mongod(mongod, workdir):
+    # mongod local jetable ; renvoie (processus, URL)
+    port = free_port()
+    dbpath = os.path.join(workdir, "mongod")
+    os.makedirs(dbpath)
+    process = subprocess.Popen(
+        [mongod, "--dbpath", dbpath, "--port", str(port), "--bind_ip", "127.0.0.1"],
+        stdout=open(os.path.join(workdir, "mongod.log"), "w"), stderr=subprocess.STDOUT,
+    )
+    url = f"mongodb://127.0.0.1:{port}/"
+    client = MongoClient(url, serverSelectionTimeoutMS=30000)
+    client.admin.command("ping")
+    client.close()
+    return process, url
+
+
+def drop_databases(url):
+    client = MongoClient(url, serverSelectionTimeoutMS=5000)
+    for name in MONGO_DATABASES:
+        client.drop_database(name)
+    client.close()
+
+
+def service_urls(base_port):
+    return {service: f"http://127.0.0.1:{base_port + PORT_OFFSETS[service]}" for service in SERVICES}
+
+
+def start_services(workdir, persistence, mongo_url, base_port, workers):
+    urls = service_urls(base_port)
+    env = dict(
+        os.environ,
+        PERSISTENCE_TYPE=persistence.upper(),
+        MOVIE_SERVICE_URL=urls["movie"],
+        SCHEDULE_SERVICE_URL=urls["schedule"],
+        USER_SERVICE_URL=urls["user"],
+        USER_CHANGE_SUBSCRIBERS=f"{urls['movie']},{urls['booking']}",
+        WEB_WORKERS=str(workers),
+        SCREENING_CAPACITY=str(BENCH_SCREENING_CAPACITY),
+    )
+    if mongo_url:
+        env["MONGO_URL"] = mongo_url
+    processes = []
+    for service in SERVICES:
+        processes.append(subprocess.Popen(
+            ["gunicorn", "-c", "../common/gunicorn_conf.py", "-b", urls[service].replace("http://", ""), f"{service}:app"],
+            cwd=os.path.join(workdir, service), env=env,
+            stdout=open(os.path.join(workdir, f"{service}.log"), "w"), stderr=subprocess.STDOUT,
+        ))
+    return processes
+
+
+def wait_ready(urls, timeout):
+    # Attend que chaque service réponde 200 sur /readyz (chargement des données compris)
+    deadline = time.monotonic() + timeout
+    for service, url in urls.items():
+        while True:
+            try:
+                if requests.get(f"{url}/readyz", timeout=1).status_code == 200:
+                    break
+            except requests.RequestException:
+                pass
+            if time.monotonic() > deadline:
+                raise RuntimeError(f"{service} n'est pas prêt après {timeout}s")
+            time.sleep(0.2)
+
+
+def stop(processes):
+    for process in processes:
+        process.terminate()
+    for process in processes:
+        try:
+            process.wait(timeout=30)
+        except subprocess.TimeoutExpired:
+            process.kill()
+
+
+# ============================================================================
+# CHARGE
+# ============================================================================
+
+def parse_weights(text):
+    weights = {}
+    for item in text.split(","):
+        name, _, weight = item.partition("=")
+        weights[name.strip()] = float(weight)
+    return weights
+
+
+class Workload:
+    # Requêtes de la charge mixte ; chaque opération renvoie (route, réponse)
+
+    def __init__(self, urls, dataset, listing_limit):
+        self.urls = urls
+        self.users = [user["id"] for user in dataset["users"] if user["role"] == "user"]
+        self.titles = [movie["title"] for movie in dataset["movies"]]
+        self.screenings = dataset["screenings"]
+        self.listing_params = {"limit": listing_limit} if listing_limit else {}
+
+    def create(self, session, rng):
+        movieid, day = rng.choice(self.screenings)
+        body = {"userid": rng.choice(self.users), "movieid": movieid, "date": day}
+        return "POST /bookings", session.post(f"{self.urls['booking']}/bookings", json=body)
+
+    def detailed(self, session, rng):
+        return "GET /bookings/<userid>/detailed", session.get(f"{self.urls['booking']}/bookings/{rng.choice(self.users)}/detailed")
+
+    def title(self, session, rng):
+        return "GET /moviesbytitle", session.get(f"{self.urls['movie']}/moviesbytitle", params={"title": rng.choice(self.titles)})
+
+    def listing(self, session, rng):
+        route, url, params = rng.choice([
+            ("GET /json", f"{self.urls['movie']}/json", {}),
+            ("GET /schedule", f"{self.urls['schedule']}/schedule", {}),
+            ("GET /bookings", f"{self.urls['booking']}/bookings", {"userid": ADMIN_ID}),
+        ])
+        return route, session.get(url, params={**params, **self.listing_params})
+
+
+def percentile(ordered, fraction):
+    if not ordered:
+        return None
+    return ordered[min(len(ordered) - 1, int(fraction * len(ordered)))]
+
+
+def run_load(workload, weights, concurrency, duration, warmup):
+    operations = [getattr(workload, name) for name in weights]
+    weight_values = list(weights.values())
+    latencies = defaultdict(list)
+    errors = defaultdict(int)
+    refusals = defaultdict(int)
+    lock = threading.Lock()
+    started = time.monotonic()
+    measure_from = started + warmup
+    stop_at = measure_from + duration
+
+    def worker(seed):
+        rng = random.Random(seed)
+        session = requests.Session()
+        local_latencies = defaultdict(list)
+        local_errors = defaultdict(int)
+        local_refusals = defaultdict(int)
+        while True:
+            now = time.monotonic()
+            if now >= stop_at:
+                break
+            operation = rng.choices(operations, weight_values)[0]
+            try:
+                route, response = operation(session, rng)
+                failed = response.status_code >= 500
+                refused = response.status_code == 409
+            except requests.RequestException:
+                route, failed, refused = operation.__name__, True, False
+            if now >= measure_from:
+                local_latencies[route].append(time.monotonic() - now)
+                if failed:
+                    local_errors[route] += 1
+                if refused:
+                    local_refusals[route] += 1
+        with lock:
+            for route, values in local_latencies.items():
+                latencies[route] += values
+            for route, count in local_errors.items():
+                errors[route] += count
+            for route, count in local_refusals.items():
+                refusals[route] += count
+
+    threads = [threading.Thread(target=worker, args=(seed,)) for seed in range(concurrency)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+    routes = {}
+    for route, values in sorted(latencies.items()):
+        ordered = sorted(values)
+        routes[route] = {
+            "count": len(ordered),
+            "errors": errors[route],
+            "refused": refusals[route],
+            "throughput": round(len(ordered) / duration, 2),
+            "mean_ms": round(sum(ordered) / len(ordered) * 1000, 3),
+            "p50_ms": round(percentile(ordered, 0.50) * 1000, 3),
+            "p95_ms": round(percentile(ordered, 0.95) * 1000, 3),
+            "p99_ms": round(percentile(ordered, 0.99) * 1000, 3),
+        }
+    everything = sorted(value for values in latencies.values() for value in values)
+    total = {
+        "count": len(everything),
+        "errors": sum(errors.values()),
+        "refused": sum(refusals.values()),
+        "throughput": round(len(everything) / duration, 2),
+        "p50_ms": round((percentile(everything, 0.50) or 0) * 1000, 3),
+        "p95_ms": round((percentile(everything, 0.95) or 0) * 1000, 3),
+        "p99_ms": round((percentile(everything, 0.99) or 0) * 1000, 3),
+    }
+    return routes, total
+
+
+# ============================================================================
+# RAPPORT ET COMPARAISON
+# ============================================================================
+
+def git_commit():
+    try:
+        return subprocess.run(["git", "rev-parse", "--short", "HEAD"], cwd=ROOT, capture_output=True, text=True).stdout.strip()
+    except OSError:
+        return None
+
+
+def print_run(run):
+    print(f"\n{run['persistence']} / {run['scale']} réservations / {run['concurrency']} clients / {run['duration']}s")
+    print(f"{'route':<34}{'req/s':>9}{'p50 ms':>9}{'p95 ms':>9}{'p99 ms':>9}{'erreurs':>9}{'refus':>9}")
+    for route, stats in list(run["routes"].items()) + [("total", run["total"])]:
+        print(f"{route:<34}{stats['throughput']:>9}{stats['p50_ms']:>9}{stats['p95_ms']:>9}{stats['p99_ms']:>9}{stats['errors']:>9}{stats.get('refused', 0):>9}")
+
+
+def compare(runs, baseline, tolerance):
+    # Régressions par rapport à un rapport précédent : p95 plus lent ou débit plus faible de plus de `tolerance`
+    previous = {(run["persistence"], run["scale"]): run for run in baseline["runs"]}
+    regressions = []
+    for run in runs:
+        before = previous.get((run["persistence"], run["scale"]))
+        if before is None:
+            continue
+        for route, stats in run["routes"].items():
+            old = before["routes"].get(route)
+            if old is None:
+                continue
+            if stats["p95_ms"] > old["p95_ms"] * (1 + tolerance):
+                regressions.append(f"{run['persistence']}/{run['scale']} {route} : p95 {old['p95_ms']} -> {stats['p95_ms']} ms")
+            if stats["throughput"] < old["throughput"] * (1 - tolerance):
+                regressions.append(f"{run['persistence']}/{run['scale']} {route} : {old['throughput']} -> {stats['throughput']} req/s")
+    return regressions
+
+
+# ============================================================================
+# PROGRAMME PRINCIPAL
+# ============================================================================
+
+def run_case(args, persistence, scale):
+    workdir = tempfile.mkdtemp(prefix=f"loadtest_{persistence}_{scale}_")
+    processes = []
+    try:
+        dataset = generate_dataset(scale)
+        urls = service_urls(args.base_port)
+        if not args.external:
+            for service in SERVICES + ["common"]:
+                shutil.copytree(os.path.join(ROOT, service), os.path.join(workdir, service),
+                                ignore=shutil.ignore_patterns("__pycache__", "*.log"))
+            write_dataset(workdir, dataset)
+
+            mongo_url = None
+            if persistence == "mongodb":
+                if args.mongo_url:
+                    mongo_url = args.mongo_url
+                    if args.drop:
+                        drop_databases(mongo_url)
+                else:
+                    mongod, mongo_url = start_mongod(args.mongod, workdir)
+                    processes.append(mongod)
+            processes = start_services(workdir, persistence, mongo_url, args.base_port, args.workers) + processes
+
+        setup_started = time.monotonic()
+        wait_ready(urls, args.ready_timeout)
+        ready_seconds = round(time.monotonic() - setup_started, 2)
+
+        workload = Workload(urls, dataset, args.listing_limit)
+        routes, total = run_load(workload, parse_weights(args.weights), args.concurrency, args.duration, args.warmup)
+        return {
+            "persistence": persistence,
+            "scale": scale,
+            "concurrency": args.concurrency,
+            "duration": args.duration,
+            "weights": args.weights,
+            "ready_seconds": ready_seconds,
+            "routes": routes,
+            "total": total,
+        }
+    finally:
+        stop(processes)
+        if args.keep:
+            print(f"Répertoire conservé : {workdir}")
+        else:
+            shutil.rmtree(workdir, ignore_errors=True)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Banc de charge des services")
+    parser.add_argument("--persistence", nargs="+", choices=["json", "mongodb"], default=["json"])
+    parser.add_argument("--scale", nargs="+", type=int, default=[1000], help="nombre de réservations générées (ex. 1000 100000 1000000)")
+    parser.add_argument("--concurrency", type=int, default=16, help="clients simultanés")
+    parser.add_argument("--duration", type=float, default=30, help="durée mesurée (s)")
+    parser.add_argument("--warmup", type=float, default=5, help="échauffement non mesuré (s)")
+    parser.add_argument("--weights", default=DEFAULT_WEIGHTS, help="poids des opérations create, detailed, title, listing")
+    parser.add_argument("--listing-limit", type=int, default=100, help="taille de page des listes (0 : listes complètes)")
+    parser.add_argument("--workers", type=int, default=4, help="workers gunicorn par service (1 en mode JSON)")
+    parser.add_argument("--base-port", type=int, default=3200)
+    parser.add_argument("--mongod", default="mongod", help="exécutable mongod à lancer en mode MongoDB")
+    parser.add_argument("--mongo-url", help="instance MongoDB existante plutôt qu'un mongod local")
+    parser.add_argument("--drop", action="store_true", help="vider les bases de --mongo-url avant le test")
+    parser.add_argument("--external", action="store_true", help="services déjà lancés sur --base-port")
+    parser.add_argument("--ready-timeout", type=float, default=600)
+    parser.add_argument("--keep", action="store_true", help="conserver le répertoire de travail (journaux)")
+    parser.add_argument("--output", help="fichier JSON du rapport")
+    parser.add_argument("--baseline", help="rapport JSON précédent à comparer")
+    parser.add_argument("--tolerance", type=float, default=0.2, help="écart toléré par rapport à --baseline")
+    args = parser.parse_args()
+
+    runs = []
+    for persistence in args.persistence:
+        for scale in args.scale:
+            run = run_case(args, persistence, scale)
+            print_run(run)
+            runs.append(run)
+
+    report = {"commit": git_commit(), "timestamp": int(time.time()), "runs": runs}
+    if args.output:
+        with open(args.output, "w") as jsf:
+            json.dump(report, jsf, indent=2)
+
+    if args.baseline:
+        with open(args.baseline) as jsf:
+            regressions = compare(runs, json.load(jsf), args.tolerance)
+        for regression in regressions:
+            print(f"RÉGRESSION : {regression}")
+        if regressions:
+            return 1
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,219 @@
+# Micro-benchmarks des traitements faits à chaque requête, à plusieurs tailles de données.
+#
+# Chaque cas est mesuré seul (hors réseau et hors serveur) ; la préparation des données
+# n'est pas comptée. Les cas d'un même groupe comparent deux façons de faire la même chose :
+#
+#   objectid   conversion des _id en chaîne (boucle des routes MongoDB) / json.dumps(default=str)
+#   serialize  jsonify d'une liste complète / réponse en flux de listing_response
+#   persist    snapshot json.dump(indent=4) (compaction du journal) / json.dump compact / Journal.put d'un document
+#   lookup     parcours linéaire d'une liste / IndexedStore.get / IndexedStore.find (index secondaire)
+#   screening  "film M programmé à la date D" sur `size` dates : parcours des dates / date puis liste
+#              des films / index des séances (film, date) du service Schedule
+#   overhead   coût par requête de l'instrumentation : histogramme, trace, lecture de cache
+#
+#   python benchmarks/micro.py [--sizes 100 1000 10000] [--only lookup] [--output micro.json]
+
+import argparse
+import json
+import os
+import random
+import statistics
+import sys
+import tempfile
+import time
+
+from bson import ObjectId
+from flask import Flask, jsonify
+
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from common.cache import TTLCache
+from common.journal import Journal
+from common.listing import listing_response
+from common.metrics import Histogram
+from common.store import IndexedStore
+from common.tracing import Trace
+
+app = Flask("micro")
+# Durée minimale de mesure par cas (s) et nombre maximal d'appels
+MIN_TIME = 0.2
+MAX_RUNS = 2000
+
+
+def movies(size):
+    return [
+        {"id": f"movie_{i:07d}", "title": f"Movie {i}", "rating": round(random.uniform(1, 10), 1), "director": f"Director {i % 97}"}
+        for i in range(size)
+    ]
+
+
+def measure(function, setup):
+    # Durées (s) d'appels successifs de function(setup()), la préparation n'étant pas mesurée
+    durations = []
+    total = 0.0
+    while (total < MIN_TIME or len(durations) < 5) and len(durations) < MAX_RUNS:
+        argument = setup()
+        started = time.perf_counter()
+        function(argument)
+        duration = time.perf_counter() - started
+        durations.append(duration)
+        total += duration
+    return durations
+
+
+# ============================================================================
+# CAS MESURÉS
+# ============================================================================
+
+def objectid_cases(size):
+    documents = [dict(movie, _id=ObjectId()) for movie in movies(size)]
+
+    def loop(docs):
+        for doc in docs:
+            doc['_id'] = str(doc['_id'])
+
+    return {
+        "boucle str(_id)": (loop, lambda: [dict(doc) for doc in documents]),
+        "json.dumps(default=str)": (lambda docs: json.dumps(docs, default=str), lambda: documents),
+    }
+
+
+def serialize_cases(size):
+    documents = movies(size)
+    listing = {"limit": None, "after": None, "fields": None, "ndjson": False}
+
+    def with_context(function):
+        def run(docs):
+            with app.test_request_context():
+                return function(docs)
+        return run
+
+    return {
+        "jsonify liste": (with_context(lambda docs: jsonify(docs).get_data()), lambda: documents),
+        "listing_response (flux)": (
+            with_context(lambda docs: listing_response(iter(docs), None, listing).get_data()), lambda: documents),
+    }
+
+
+def persist_cases(size):
+    documents = movies(size)
+    directory = tempfile.mkdtemp(prefix="micro_persist_")
+    snapshot_path = os.path.join(directory, "movies.json")
+    with open(snapshot_path, "w") as jsf:
+        json.dump({"movies": documents}, jsf)
+    journal = Journal(snapshot_path, "movies", "id", fsync="never", compact_threshold=10 ** 9)
+    journal.load()
+
+    def dump(indent):
+        def run(docs):
+            with open(os.path.join(directory, "snapshot.json"), "w") as jsf:
+                json.dump({"movies": docs}, jsf, indent=indent)
+        return run
+
+    return {
+        "json.dump indent=4": (dump(4), lambda: documents),
+        "json.dump compact": (dump(None), lambda: documents),
+        "Journal.put (1 document)": (journal.put, lambda: random.choice(documents)),
+    }
+
+
+def lookup_cases(size):
+    documents = movies(size)
+    store = IndexedStore("id", documents, indexes={"title": lambda movie: [movie["title"].lower()]})
+    keys = [movie["id"] for movie in documents]
+
+    return {
+        "parcours linéaire": (lambda key: next(doc for doc in documents if doc["id"] == key), lambda: random.choice(keys)),
+        "IndexedStore.get": (store.get, lambda: random.choice(keys)),
+        "IndexedStore.find (titre)": (
+            lambda title: store.find("title", title), lambda: f"movie {random.randrange(size)}"),
+    }
+
+
+def screening_cases(size):
+    # `size` dates de 20 films chacune, tirés parmi 200
+    entries = [
+        {"date": f"{20200101 + i}", "movies": [f"movie_{(i + j * 7) % 200:03d}" for j in range(20)]}
+        for i in range(size)
+    ]
+    store = IndexedStore("date", entries, indexes={
+        "screening": lambda item: [(movieid, item["date"]) for movieid in item.get("movies", [])],
+    })
+
+    def scan(pair):
+        movieid, date = pair
+        return any(entry["date"] == date and movieid in entry["movies"] for entry in entries)
+
+    def by_date(pair):
+        entry = store.get(pair[1])
+        return entry is not None and pair[0] in entry["movies"]
+
+    def pair():
+        return f"movie_{random.randrange(200):03d}", random.choice(entries)["date"]
+
+    return {
+        "parcours des dates": (scan, pair),
+        "date puis liste des films": (by_date, pair),
+        "index (film, date)": (lambda value: store.exists("screening", value), pair),
+    }
+
+
+def overhead_cases(size):
+    histogram = Histogram("micro_seconds", "", ("method", "route"))
+    cache = TTLCache(size, 60)
+    for i in range(size):
+        cache.set(i, i)
+
+    def trace(_):
+        current = Trace("micro", "GET /movies/<movieid>")
+        current.add("db", "mongo find", "mongo", time.perf_counter(), 0.001)
+        current.finish(200)
+
+    return {
+        "Histogram.observe": (lambda value: histogram.observe(value, "GET", "/movies/<movieid>"), random.random),
+        "Trace + finish": (trace, lambda: None),
+        "TTLCache.get": (cache.get, lambda: random.randrange(size)),
+    }
+
+
+GROUPS = {
+    "objectid": objectid_cases,
+    "serialize": serialize_cases,
+    "persist": persist_cases,
+    "lookup": lookup_cases,
+    "screening": screening_cases,
+    "overhead": overhead_cases,
+}
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Micro-benchmarks des traitements par requête")
+    parser.add_argument("--sizes", nargs="+", type=int, default=[100, 1000, 10000])
+    parser.add_argument("--only", nargs="+", choices=list(GROUPS), help="groupes à mesurer")
+    parser.add_argument("--output", help="fichier JSON des résultats")
+    args = parser.parse_args()
+
+    results = []
+    print(f"{'groupe':<10}{'cas':<28}{'taille':>9}{'médiane µs':>13}{'min µs':>11}{'appels':>8}")
+    for group in args.only or GROUPS:
+        for size in args.sizes:
+            for name, (function, setup) in GROUPS[group](size).items():
+                durations = measure(function, setup)
+                result = {
+                    "group": group,
+                    "case": name,
+                    "size": size,
+                    "median_us": round(statistics.median(durations) * 1e6, 2),
+                    "min_us": round(min(durations) * 1e6, 2),
+                    "runs": len(durations),
+                }
+                results.append(result)
+                print(f"{group:<10}{name:<28}{size:>9}{result['median_us']:>13}{result['min_us']:>11}{result['runs']:>8}")
+
+    if args.output:
+        with open(args.output, "w") as jsf:
+            json.dump(results, jsf, indent=2)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
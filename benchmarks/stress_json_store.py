@@ -0,0 +1,219 @@
+# Test de charge du stockage JSON (IndexedStore + journal) sous accès concurrents.
+#
+# Des threads créent et suppriment en parallèle des réservations sur des utilisateurs
+# partagés (chaque thread réserve son propre film, et connaît donc exactement l'état
+# attendu pour ce film) pendant que d'autres threads lisent via les index. On vérifie
+# ensuite qu'aucune écriture n'a été perdue, que les index et les clés triées sont
+# cohérents avec les documents et que le journal rejoué redonne le même état.
+#
+#   python benchmarks/stress_json_store.py [--threads 16] [--operations 2000]
+#
+# Avec --url, les mêmes créations/suppressions sont envoyées au service Schedule
+# lancé en mode JSON (un film par thread, dates partagées), puis vérifiées via GET /schedule :
+#
+#   python benchmarks/stress_json_store.py --url http://localhost:3202
+
+import argparse
+import json
+import os
+import random
+import sys
+import tempfile
+import threading
+import time
+
+import requests
+
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from common.journal import Journal
+from common.store import IndexedStore
+
+USERS = [f"user_{i}" for i in range(20)]
+DATES = [f"202501{day:02d}" for day in range(1, 11)]
+
+
+def screenings(booking):
+    return [(movie_id, date_entry["date"]) for date_entry in booking.get("dates", []) for movie_id in date_entry["movies"]]
+
+
+def toggle_booking(store, userid, movieid, date):
+    # Même lecture-modification-écriture que create_booking / delete_booking en mode JSON ;
+    # renvoie True si la réservation existe après l'opération
+    with store.locked(userid):
+        booking = store.copy(userid) or {"userid": userid, "dates": []}
+        date_entry = next((entry for entry in booking["dates"] if entry["date"] == date), None)
+        if date_entry is None:
+            date_entry = {"date": date, "movies": []}
+            booking["dates"].append(date_entry)
+        if movieid in date_entry["movies"]:
+            date_entry["movies"].remove(movieid)
+            if not date_entry["movies"]:
+                booking["dates"].remove(date_entry)
+            if booking["dates"]:
+                store.put(booking)
+            else:
+                store.delete(userid)
+            return False
+        date_entry["movies"].append(movieid)
+        store.put(booking)
+        return True
+
+
+def run_store(threads, operations, readers):
+    directory = tempfile.mkdtemp(prefix="stress_json_store_")
+    snapshot_path = os.path.join(directory, "bookings.json")
+    with open(snapshot_path, "w") as jsf:
+        json.dump({"bookings": []}, jsf)
+
+    # Seuil de compaction bas pour que des compactions aient lieu pendant le test
+    journal = Journal(snapshot_path, "bookings", "userid", fsync="never", compact_threshold=operations)
+    store = IndexedStore("userid", indexes={"screening": screenings})
+    store.open(journal)
+
+    expected = [set() for _ in range(threads)]
+    errors = []
+    stop = threading.Event()
+
+    def writer(worker):
+        movieid = f"movie_{worker}"
+        rng = random.Random(worker)
+        for _ in range(operations):
+            userid, date = rng.choice(USERS), rng.choice(DATES)
+            if toggle_booking(store, userid, movieid, date):
+                expected[worker].add((userid, date))
+            else:
+                expected[worker].discard((userid, date))
+
+    def reader():
+        rng = random.Random()
+        while not stop.is_set():
+            screening = (f"movie_{rng.randrange(threads)}", rng.choice(DATES))
+            for booking in store.find("screening", screening):
+                if screening not in screenings(booking):
+                    errors.append(f"index incohérent : {booking['userid']} renvoyé pour {screening}")
+            for key in store.keys_after(None, 5):
+                store.get(key)
+
+    reader_threads = [threading.Thread(target=reader) for _ in range(readers)]
+    writer_threads = [threading.Thread(target=writer, args=(worker,)) for worker in range(threads)]
+    started = time.perf_counter()
+    for thread in reader_threads + writer_threads:
+        thread.start()
+    for thread in writer_threads:
+        thread.join()
+    elapsed = time.perf_counter() - started
+    stop.set()
+    for thread in reader_threads:
+        thread.join()
+    if journal.compaction_thread is not None:
+        journal.compaction_thread.join()
+
+    # Aucune écriture perdue : l'état de chaque film est celui attendu par son thread
+    actual = [set() for _ in range(threads)]
+    for booking in store.values():
+        for movieid, date in screenings(booking):
+            actual[int(movieid.split("_")[1])].add((booking["userid"], date))
+    for worker in range(threads):
+        if actual[worker] != expected[worker]:
+            errors.append(f"movie_{worker} : {len(expected[worker] ^ actual[worker])} réservations perdues ou en trop")
+
+    # Index et clés triées cohérents avec les documents
+    if store.sorted_keys != sorted(store.documents):
+        errors.append("clés triées incohérentes")
+    for booking in store.values():
+        if not booking["dates"]:
+            errors.append(f"utilisateur sans réservation conservé : {booking['userid']}")
+        for screening in screenings(booking):
+            if booking["userid"] not in store.indexes["screening"].get(screening, {}):
+                errors.append(f"entrée d'index manquante : {booking['userid']} {screening}")
+    indexed = sum(len(bucket) for bucket in store.indexes["screening"].values())
+    if indexed != sum(len(set(screenings(booking))) for booking in store.values()):
+        errors.append("entrées d'index en trop")
+
+    # Le journal rejoué redonne le même état
+    journal.close()
+    replayed = IndexedStore("userid")
+    replayed.load(Journal(snapshot_path, "bookings", "userid").load())
+    if {key: replayed.get(key) for key in replayed.documents} != store.documents:
+        errors.append("état rejoué depuis le journal différent de l'état en mémoire")
+
+    total = threads * operations
+    print(f"{total} écritures par {threads} threads ({readers} lecteurs) en {elapsed:.2f}s, {total / elapsed:.0f} écritures/s")
+    return errors
+
+
+def run_http(url, threads, operations):
+    session_local = threading.local()
+    expected = [set() for _ in range(threads)]
+    errors = []
+
+    def session():
+        if not hasattr(session_local, "session"):
+            session_local.session = requests.Session()
+        return session_local.session
+
+    def writer(worker):
+        movieid = f"stress_movie_{worker}"
+        rng = random.Random(worker)
+        for _ in range(operations):
+            date = rng.choice(DATES)
+            if date in expected[worker]:
+                response = session().delete(f"{url}/schedule/{movieid}/{date}")
+                if response.status_code == 200:
+                    expected[worker].discard(date)
+                else:
+                    errors.append(f"DELETE {movieid} {date} : {response.status_code}")
+            else:
+                response = session().post(f"{url}/schedule", json={"movieid": movieid, "date": date})
+                if response.status_code == 201:
+                    expected[worker].add(date)
+                else:
+                    errors.append(f"POST {movieid} {date} : {response.status_code}")
+
+    writer_threads = [threading.Thread(target=writer, args=(worker,)) for worker in range(threads)]
+    started = time.perf_counter()
+    for thread in writer_threads:
+        thread.start()
+    for thread in writer_threads:
+        thread.join()
+    elapsed = time.perf_counter() - started
+
+    actual = [set() for _ in range(threads)]
+    for entry in requests.get(f"{url}/schedule").json():
+        for movieid in entry.get("movies", []):
+            if movieid.startswith("stress_movie_"):
+                actual[int(movieid.rsplit("_", 1)[1])].add(entry["date"])
+    for worker in range(threads):
+        if actual[worker] != expected[worker]:
+            errors.append(f"stress_movie_{worker} : {len(expected[worker] ^ actual[worker])} horaires perdus ou en trop")
+
+    # Nettoyage
+    for worker in range(threads):
+        for date in expected[worker]:
+            requests.delete(f"{url}/schedule/stress_movie_{worker}/{date}")
+
+    total = threads * operations
+    print(f"{total} requêtes par {threads} threads en {elapsed:.2f}s, {total / elapsed:.0f} requêtes/s")
+    return errors
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Test de charge concurrent du stockage JSON")
+    parser.add_argument("--threads", type=int, default=16)
+    parser.add_argument("--operations", type=int, default=2000, help="opérations par thread")
+    parser.add_argument("--readers", type=int, default=4)
+    parser.add_argument("--url", help="URL du service Schedule (mode JSON) à tester par HTTP")
+    args = parser.parse_args()
+
+    if args.url:
+        errors = run_http(args.url.rstrip("/"), args.threads, args.operations)
+    else:
+        errors = run_store(args.threads, args.operations, args.readers)
+    for error in errors[:20]:
+        print(f"ÉCHEC : {error}")
+    print("OK" if not errors else f"{len(errors)} violations d'invariants")
+    return 1 if errors else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,171 @@
+# Création de réservations en masse (POST /bookings/bulk), commune à booking.py et
+# booking_async.py. Les éléments sont des tuples (index, userid, movieid, date) et
+# chaque fonction inscrit dans `results` le statut des éléments qu'elle écarte.
+
+import uuid
+
+from pymongo import InsertOne, UpdateOne
+
+from common.bulk import item_result
+from common.idempotency import KEY_HEADER
+
+ALREADY_BOOKED = "Film déjà réservé pour cette date"
+NOT_SCHEDULED = "Film non programmé à cette date"
+NO_SEATS = "Plus de place disponible pour cette séance"
+
+
+def check_references(results, items, movies_by_id, available_pairs):
+    # Éléments dont le film existe et est programmé à la date demandée ; les autres sont marqués 404
+    valid = []
+    for item in items:
+        index, _, movieid, date = item
+        if movieid not in movies_by_id:
+            results[index] = item_result(index, 404, "Film non trouvé")
+        elif (movieid, date) not in available_pairs:
+            results[index] = item_result(index, 404, NOT_SCHEDULED)
+        else:
+            valid.append(item)
+    return valid
+
+
+def screening_groups(items):
+    # Éléments regroupés par séance (film, date)
+    groups = {}
+    for item in items:
+        groups.setdefault((item[2], item[3]), []).append(item)
+    return groups
+
+
+def seat_items(screenings):
+    # Corps des routes /schedule/seats/reserve et /release pour {(film, date): places}
+    return [{"movieid": movieid, "date": date, "seats": seats} for (movieid, date), seats in screenings.items()]
+
+
+def seat_headers():
+    # En-têtes d'un appel à /schedule/seats/reserve ou /release : une clé d'idempotence
+    # propre à l'appel, renvoyée à chacun de ses essais, pour que Schedule ne retire ou ne
+    # rende les places qu'une fois même si un essai expire après avoir été traité. La clé
+    # du client n'est pas reprise : après une erreur 5xx, son nouvel essai doit réserver à nouveau
+    return {KEY_HEADER: uuid.uuid4().hex}
+
+
+def check_seats(results, groups, seat_results):
+    # Éléments dont la séance a obtenu toutes ses places ; les autres sont marqués 404
+    # (séance retirée entre-temps) ou 409 (plus assez de places)
+    valid = []
+    for seat_result in seat_results:
+        group = groups[(seat_result["movieid"], seat_result["date"])]
+        if seat_result["status"] == 200:
+            valid.extend(group)
+            continue
+        for index, _, _, _ in group:
+            if seat_result["status"] == 404:
+                results[index] = item_result(index, 404, NOT_SCHEDULED)
+            else:
+                results[index] = item_result(index, 409, NO_SEATS)
+    return sorted(valid)
+
+
+def reserved_seats(groups, seat_results):
+    # {(film, date): places} des séances dont la réservation a abouti
+    screenings = {}
+    for seat_result in seat_results:
+        if seat_result["status"] == 200:
+            screening = (seat_result["movieid"], seat_result["date"])
+            screenings[screening] = len(groups[screening])
+    return screenings
+
+
+def unused_seats(results, items):
+    # Places réservées pour des éléments finalement non créés (déjà réservés), à rendre
+    screenings = {}
+    for index, _, movieid, date in items:
+        if results[index]["status"] != 201:
+            screenings[(movieid, date)] = screenings.get((movieid, date), 0) + 1
+    return screenings
+
+
+def booked_seats(booking):
+    # {(film, date): places} d'un document imbriqué, rendues quand il est supprimé
+    screenings = {}
+    for date_entry in booking.get("dates", []):
+        for movieid in date_entry["movies"]:
+            screenings[(movieid, date_entry["date"])] = screenings.get((movieid, date_entry["date"]), 0) + 1
+    return screenings
+
+
+def add_to_booking(booking, movieid, date):
+    # Ajoute le film à la date d'un document imbriqué (modifié en place) ; False s'il y est déjà
+    for date_entry in booking["dates"]:
+        if date_entry["date"] == date:
+            if movieid in date_entry["movies"]:
+                return False
+            date_entry["movies"].append(movieid)
+            return True
+    booking["dates"].append({"date": date, "movies": [movieid]})
+    return True
+
+
+def merge_bookings(results, items, copy):
+    # Documents imbriqués modifiés par les éléments (mode JSON) ; `copy(userid)` renvoie une
+    # copie modifiable du document actuel de l'utilisateur, ou None
+    documents = {}
+    changed = {}
+    for index, userid, movieid, date in items:
+        if userid not in documents:
+            documents[userid] = copy(userid) or {"userid": userid, "dates": []}
+        if add_to_booking(documents[userid], movieid, date):
+            results[index] = item_result(index, 201)
+            changed[userid] = documents[userid]
+        else:
+            results[index] = item_result(index, 409, ALREADY_BOOKED)
+    return list(changed.values())
+
+
+def flat_operations(items):
+    # Une insertion par réservation (disposition à plat), l'index unique détecte les doublons
+    operations = [InsertOne({"userid": userid, "date": date, "movieid": movieid}) for _, userid, movieid, date in items]
+    return operations, [[item] for item in items]
+
+
+def nested_operations(results, items, existing):
+    # Opérations de la disposition imbriquée et éléments écrits par chacune, à partir des
+    # documents actuels des utilisateurs (`existing`) : les réservations déjà présentes sont
+    # marquées 409, puis chaque utilisateur reçoit un $addToSet par date déjà présente et
+    # un seul $push (avec upsert) pour l'ensemble de ses nouvelles dates
+    booked = {
+        booking["userid"]: {date_entry["date"]: set(date_entry["movies"]) for date_entry in booking.get("dates", [])}
+        for booking in existing
+    }
+    added = {}
+    for item in items:
+        index, userid, movieid, date = item
+        if movieid in booked.get(userid, {}).get(date, ()):
+            results[index] = item_result(index, 409, ALREADY_BOOKED)
+        else:
+            added.setdefault(userid, {}).setdefault(date, []).append(item)
+
+    operations, operation_items = [], []
+    for userid, dates in added.items():
+        new_dates = {}
+        for date, date_items in dates.items():
+            if date not in booked.get(userid, {}):
+                new_dates[date] = date_items
+                continue
+            operations.append(UpdateOne(
+                {"userid": userid, "dates.date": date},
+                {"$addToSet": {"dates.$[entry].movies": {"$each": [item[2] for item in date_items]}}},
+                array_filters=[{"entry.date": date}]
+            ))
+            operation_items.append(date_items)
+        if new_dates:
+            operations.append(UpdateOne(
+                {"userid": userid, "dates.date": {"$nin": list(new_dates)}},
+                {"$push": {"dates": {"$each": [
+                    {"date": date, "movies": [item[2] for item in date_items]} for date, date_items in new_dates.items()
+                ]}}},
+                upsert=True
+            ))
+            operation_items.append([item for date_items in new_dates.values() for item in date_items])
+    return operations, operation_items
+
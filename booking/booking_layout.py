@@ -0,0 +1,100 @@
+# Disposition "à plat" des réservations en mode MongoDB : une entrée par
+# réservation {userid, date, movieid} dans la collection booking_entries,
+# au lieu d'un document par utilisateur contenant toutes ses dates.
+#
+# Les réponses de l'API gardent la forme imbriquée {userid, dates: [{date, movies}]},
+# reconstruite à la lecture.
+
+from pymongo import ASCENDING, IndexModel
+
+ENTRIES_COLLECTION = "booking_entries"
+
+ENTRY_INDEXES = [
+    # Une réservation est unique ; sert aussi aux lectures par utilisateur, triées par date
+    IndexModel([("userid", ASCENDING), ("date", ASCENDING), ("movieid", ASCENDING)],
+               unique=True, name="entry_unique"),
+    # Qui a réservé le film M à la date D
+    IndexModel([("movieid", ASCENDING), ("date", ASCENDING), ("userid", ASCENDING)], name="movie_date"),
+]
+
+# Champs identifiant une entrée (clé de l'index entry_unique)
+ENTRY_KEYS = ("userid", "date", "movieid")
+# Parcours des entrées dans l'ordre de l'index entry_unique, couvert par l'index
+ENTRY_ORDER = [(key, ASCENDING) for key in ENTRY_KEYS]
+ENTRY_PROJECTION = {"_id": 0, **{key: 1 for key in ENTRY_KEYS}}
+
+ENTRY_HOT_QUERIES = {
+    "get_user_bookings": {"filter": {"userid": "user_id"}, "sort": [("date", ASCENDING), ("movieid", ASCENDING)]},
+    "get_movie_bookings": {"filter": {"movieid": "movie_id", "date": "20151130"}},
+    "list_bookings_page": {"filter": {"userid": {"$gt": "user_id"}}, "sort": ENTRY_ORDER},
+}
+
+
+def flatten(booking):
+    # Entrées à plat d'un document de réservations imbriqué
+    return [
+        {"userid": booking["userid"], "date": date_entry["date"], "movieid": movie_id}
+        for date_entry in booking.get("dates", [])
+        for movie_id in date_entry["movies"]
+    ]
+
+
+def nest(userid, entries):
+    # Document imbriqué d'un utilisateur à partir de ses entrées triées par date ;
+    # None s'il n'a aucune réservation
+    dates = []
+    for entry in entries:
+        if not dates or dates[-1]["date"] != entry["date"]:
+            dates.append({"date": entry["date"], "movies": []})
+        dates[-1]["movies"].append(entry["movieid"])
+    if not dates:
+        return None
+    return {"userid": userid, "dates": dates}
+
+
+def nested_documents(entries, fields=None):
+    # Documents imbriqués, un par utilisateur, à partir d'entrées triées par (userid,
+    # date, movieid) : produits au fil du parcours, sans regrouper toute la collection
+    userid, group = None, []
+    for entry in entries:
+        if group and entry["userid"] != userid:
+            yield project(nest(userid, group), fields)
+            group = []
+        userid = entry["userid"]
+        group.append(entry)
+    if group:
+        yield project(nest(userid, group), fields)
+
+
+async def nested_documents_async(entries, fields=None):
+    # Équivalent de nested_documents pour un curseur asynchrone
+    userid, group = None, []
+    async for entry in entries:
+        if group and entry["userid"] != userid:
+            yield project(nest(userid, group), fields)
+            group = []
+        userid = entry["userid"]
+        group.append(entry)
+    if group:
+        yield project(nest(userid, group), fields)
+
+
+def project(booking, fields):
+    # Projection ?fields= d'un document imbriqué (userid toujours inclus)
+    if not fields:
+        return booking
+    return {key: value for key, value in booking.items() if key in fields or key == "userid"}
+
+
+def nested_pipeline(match):
+    # Agrégation regroupant les entrées en documents imbriqués, triés par utilisateur
+    # (migration ; les listes paginées utilisent nested_documents)
+    return [
+        {"$match": match},
+        {"$sort": {"userid": 1, "date": 1, "movieid": 1}},
+        {"$group": {"_id": {"userid": "$userid", "date": "$date"}, "movies": {"$push": "$movieid"}}},
+        {"$sort": {"_id.userid": 1, "_id.date": 1}},
+        {"$group": {"_id": "$_id.userid", "dates": {"$push": {"date": "$_id.date", "movies": "$movies"}}}},
+        {"$sort": {"_id": 1}},
+        {"$project": {"_id": 0, "userid": "$_id", "dates": 1}},
+    ]
@@ -0,0 +1 @@
+# Modules partagés par les micro-services (client HTTP inter-services, ...)
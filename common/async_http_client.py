@@ -0,0 +1,102 @@
+import asyncio
+import random
+import time
+
+import httpx
+
+from common.http_client import (
+    CircuitBreaker, HTTP_CONNECT_TIMEOUT, HTTP_MAX_RETRIES, HTTP_POOL_MAXSIZE, HTTP_READ_TIMEOUT,
+    HTTP_RETRY_BACKOFF, IDEMPOTENT_METHODS, RETRYABLE_STATUS_CODES,
+)
+from common.metrics import CIRCUIT_OPEN, DOWNSTREAM_DURATION
+from common.tracing import outgoing_headers, record_call
+
+
+class CircuitOpenError(httpx.TransportError):
+    # Levée lorsque le disjoncteur d'un service est ouvert : l'appel n'est pas tenté
+    pass
+
+
+class AsyncServiceClient:
+    # Équivalent asyncio de ServiceClient (httpx) : mêmes timeouts, réessais et disjoncteur.
+    # Le client httpx doit être ouvert dans la boucle d'événements qui l'utilise (open/close)
+
+    def __init__(self, name, base_url, pool_maxsize=HTTP_POOL_MAXSIZE,
+                 connect_timeout=HTTP_CONNECT_TIMEOUT, read_timeout=HTTP_READ_TIMEOUT,
+                 max_retries=HTTP_MAX_RETRIES, retry_backoff=HTTP_RETRY_BACKOFF):
+        self.name = name
+        self.base_url = base_url.rstrip("/")
+        self.pool_maxsize = pool_maxsize
+        self.timeout = httpx.Timeout(read_timeout, connect=connect_timeout)
+        self.max_retries = max_retries
+        self.retry_backoff = retry_backoff
+        self.breaker = CircuitBreaker()
+        self.client = None
+
+    def open(self):
+        self.client = httpx.AsyncClient(
+            base_url=self.base_url,
+            timeout=self.timeout,
+            limits=httpx.Limits(max_connections=self.pool_maxsize, max_keepalive_connections=self.pool_maxsize),
+        )
+
+    async def close(self):
+        await self.client.aclose()
+
+    async def request(self, method, path, retry=None, **kwargs):
+        # Envoie une requête au service ; les méthodes non idempotentes ne sont
+        # réessayées que si retry=True est passé explicitement
+        method = method.upper()
+        if retry is None:
+            retry = method in IDEMPOTENT_METHODS
+        attempts = 1 + (self.max_retries if retry else 0)
+        # En-têtes de l'appelant (dont Idempotency-Key), renvoyés à chaque essai
+        caller_headers = kwargs.pop("headers", None)
+
+        for attempt in range(attempts):
+            if not self.breaker.allow():
+                CIRCUIT_OPEN.inc(self.name)
+                raise CircuitOpenError(f"Circuit ouvert pour le service {self.name}")
+            # Un span par tentative, propagé au service appelé par l'en-tête traceparent
+            span_id, headers = outgoing_headers(caller_headers)
+            started = time.perf_counter()
+            try:
+                response = await self.client.request(method, path, headers=headers, **kwargs)
+            except httpx.TransportError:
+                DOWNSTREAM_DURATION.observe(time.perf_counter() - started, self.name, method, "error")
+                record_call(span_id, self.name, method, path, started, "error")
+                self.breaker.record_failure()
+                if attempt == attempts - 1:
+                    raise
+            else:
+                DOWNSTREAM_DURATION.observe(time.perf_counter() - started, self.name, method, str(response.status_code))
+                record_call(span_id, self.name, method, path, started, response.status_code)
+                if response.status_code not in RETRYABLE_STATUS_CODES:
+                    self.breaker.record_success()
+                    return response
+                self.breaker.record_failure()
+                if attempt == attempts - 1:
+                    return response
+            # Backoff exponentiel avec jitter complet
+            await asyncio.sleep(random.uniform(0, self.retry_backoff * (2 ** attempt)))
+
+    async def get(self, path, **kwargs):
+        return await self.request("GET", path, **kwargs)
+
+    async def post(self, path, **kwargs):
+        return await self.request("POST", path, **kwargs)
+
+    async def get_json(self, path, cache):
+        # GET conditionnel : le JSON déjà reçu (conservé dans `cache` avec son ETag)
+        # est réutilisé si le service répond 304. Renvoie None si la réponse n'est pas 200
+        entry = cache.entry(path)
+        headers = {"If-None-Match": entry[0][0]} if entry else {}
+        response = await self.get(path, headers=headers)
+        if response.status_code == 304 and entry:
+            return entry[0][1]
+        if response.status_code != 200:
+            return None
+        data = response.json()
+        if response.headers.get("ETag"):
+            cache.set(path, (response.headers["ETag"], data))
+        return data
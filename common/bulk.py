@@ -0,0 +1,46 @@
+# Requêtes en masse (POST .../bulk) : validation des éléments et résultat par élément.
+#
+# Le corps est {"items": [...]} ; la réponse {"results": [...], "created": n} donne, dans
+# l'ordre des éléments, le statut de chacun (201 créé, 400 invalide, 404 référence
+# inconnue, 409 déjà existant ou en double dans la requête) et l'erreur éventuelle.
+
+import os
+
+BULK_MAX_ITEMS = int(os.getenv("BULK_MAX_ITEMS", "10000"))
+
+
+def item_result(index, status, error=None):
+    result = {"index": index, "status": status}
+    if error:
+        result["error"] = error
+    return result
+
+
+def parse_bulk_items(body, fields, max_items=BULK_MAX_ITEMS):
+    # (résultats, éléments valides) : les éléments invalides ou en double ont déjà leur
+    # résultat, les autres sont renvoyés sous la forme (index, champ 1, champ 2, ...).
+    # Lève ValueError si le corps lui-même est invalide
+    if not isinstance(body, dict) or not isinstance(body.get("items"), list):
+        raise ValueError("Liste 'items' requise")
+    items = body["items"]
+    if len(items) > max_items:
+        raise ValueError(f"Au plus {max_items} éléments par requête")
+
+    required = f"{', '.join(fields[:-1])} et {fields[-1]} requis"
+    results = [None] * len(items)
+    valid = []
+    seen = set()
+    for index, item in enumerate(items):
+        values = tuple(item.get(field) for field in fields) if isinstance(item, dict) else ()
+        if not values or not all(isinstance(value, str) and value for value in values):
+            results[index] = item_result(index, 400, required)
+        elif values in seen:
+            results[index] = item_result(index, 409, "Élément en double dans la requête")
+        else:
+            seen.add(values)
+            valid.append((index, *values))
+    return results, valid
+
+
+def bulk_response(results):
+    return {"results": results, "created": sum(1 for result in results if result["status"] == 201)}
@@ -0,0 +1,78 @@
+import threading
+import time
+from collections import OrderedDict
+
+
+class TTLCache:
+    # Cache LRU borné à `maxsize` entrées, chacune expirant `ttl` secondes après son écriture.
+    # Les entrées expirées restent lisibles via entry() (revalidation conditionnelle)
+    # jusqu'à leur éviction
+
+    def __init__(self, maxsize, ttl):
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self.entries = OrderedDict()
+        # Incrémenté à chaque invalidation : une valeur lue avant une invalidation
+        # ne doit pas être écrite après elle
+        self.generation = 0
+        # Lectures par résultat, exportées par /metrics
+        self.stats = {"hit": 0, "stale": 0, "miss": 0}
+        self.lock = threading.Lock()
+
+    def __len__(self):
+        return len(self.entries)
+
+    def entry(self, key):
+        # (valeur, expirée) ou None si la clé est absente
+        with self.lock:
+            if key not in self.entries:
+                self.stats["miss"] += 1
+                return None
+            self.entries.move_to_end(key)
+            expires_at, value = self.entries[key]
+            expired = time.monotonic() >= expires_at
+            self.stats["stale" if expired else "hit"] += 1
+            return value, expired
+
+    def get(self, key, default=None):
+        # Valeur non expirée, sinon `default`
+        entry = self.entry(key)
+        if entry is None or entry[1]:
+            return default
+        return entry[0]
+
+    def set(self, key, value, generation=None):
+        # Enregistre une valeur ; ignorée si une invalidation a eu lieu depuis `generation`
+        with self.lock:
+            if generation is not None and generation != self.generation:
+                return
+            self.entries[key] = (time.monotonic() + self.ttl, value)
+            self.entries.move_to_end(key)
+            while len(self.entries) > self.maxsize:
+                self.entries.popitem(last=False)
+
+    def add(self, key, value):
+        # Enregistre `value` si la clé est absente ou expirée et renvoie None ; sinon
+        # renvoie la valeur présente, sans la remplacer (vérification et écriture atomiques)
+        with self.lock:
+            entry = self.entries.get(key)
+            if entry is not None and time.monotonic() < entry[0]:
+                self.stats["hit"] += 1
+                self.entries.move_to_end(key)
+                return entry[1]
+            self.stats["miss"] += 1
+            self.entries[key] = (time.monotonic() + self.ttl, value)
+            self.entries.move_to_end(key)
+            while len(self.entries) > self.maxsize:
+                self.entries.popitem(last=False)
+            return None
+
+    def invalidate(self, key):
+        with self.lock:
+            self.generation += 1
+            self.entries.pop(key, None)
+
+    def clear(self):
+        with self.lock:
+            self.generation += 1
+            self.entries.clear()
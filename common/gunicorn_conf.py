@@ -0,0 +1,45 @@
+# Configuration gunicorn commune aux quatre services (serveur de production).
+#
+#   cd movie && gunicorn -c ../common/gunicorn_conf.py -b 0.0.0.0:3200 movie:app
+#
+# Workers multi-threads (gthread). L'application n'est pas préchargée : chaque worker
+# importe le service après le fork et crée donc son propre MongoClient, ses pools
+# HTTP et ses threads (aucun état ouvert n'est hérité du processus maître).
+#
+# Règles pour l'état en mémoire :
+#   - mode JSON : les données vivent dans un seul processus, seul écrivain de son
+#     journal ; un seul worker est donc lancé et la charge est répartie sur ses threads
+#   - mode MongoDB : les caches (réponses, utilisateurs) sont propres à chaque worker ;
+#     une écriture ne vide que le cache du worker qui l'a traitée, les autres workers
+#     voient la modification au plus tard après le TTL de leur cache, ramené à
+#     WEB_CACHE_TTL secondes lorsque plusieurs workers sont lancés. Les notifications
+#     de User passent par un fichier d'invalidations propre au lancement
+#     (USER_INVALIDATION_FILE, voir common/user_directory.py), lu par tous les workers
+
+import multiprocessing
+import os
+import tempfile
+
+worker_class = "gthread"
+workers = int(os.getenv("WEB_WORKERS", str(multiprocessing.cpu_count())))
+threads = int(os.getenv("WEB_THREADS", "8"))
+keepalive = int(os.getenv("WEB_KEEPALIVE", "5"))
+timeout = int(os.getenv("WEB_TIMEOUT", "30"))
+# Délai laissé aux requêtes en cours après SIGTERM avant l'arrêt forcé des workers
+graceful_timeout = int(os.getenv("WEB_GRACEFUL_TIMEOUT", "30"))
+backlog = int(os.getenv("WEB_BACKLOG", "2048"))
+preload_app = False
+
+accesslog = os.getenv("WEB_ACCESS_LOG", "-")
+errorlog = "-"
+
+if os.getenv("PERSISTENCE_TYPE", "MONGODB").upper() != "MONGODB":
+    workers = 1
+
+if workers > 1:
+    # Les workers héritent de l'environnement du maître
+    WEB_CACHE_TTL = os.getenv("WEB_CACHE_TTL", "5")
+    os.environ.setdefault("RESPONSE_CACHE_TTL", WEB_CACHE_TTL)
+    os.environ.setdefault("USER_CACHE_TTL", WEB_CACHE_TTL)
+    # Un fichier par processus maître : les workers d'un même lancement le partagent
+    os.environ.setdefault("USER_INVALIDATION_FILE", os.path.join(tempfile.gettempdir(), f"user_invalidations_{os.getpid()}.log"))
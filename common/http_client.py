@@ -0,0 +1,142 @@
+import os
+import random
+import threading
+import time
+
+import requests
+from requests.adapters import HTTPAdapter
+
+from common.metrics import CIRCUIT_OPEN, DOWNSTREAM_DURATION
+from common.tracing import outgoing_headers, record_call
+
+# Paramètres par défaut des appels inter-services (surchargeables par variables d'environnement)
+HTTP_POOL_MAXSIZE = int(os.getenv("HTTP_POOL_MAXSIZE", "20"))
+HTTP_CONNECT_TIMEOUT = float(os.getenv("HTTP_CONNECT_TIMEOUT", "1.0"))
+HTTP_READ_TIMEOUT = float(os.getenv("HTTP_READ_TIMEOUT", "5.0"))
+HTTP_MAX_RETRIES = int(os.getenv("HTTP_MAX_RETRIES", "2"))
+HTTP_RETRY_BACKOFF = float(os.getenv("HTTP_RETRY_BACKOFF", "0.05"))
+CIRCUIT_FAILURE_THRESHOLD = int(os.getenv("CIRCUIT_FAILURE_THRESHOLD", "5"))
+CIRCUIT_RESET_TIMEOUT = float(os.getenv("CIRCUIT_RESET_TIMEOUT", "10.0"))
+
+RETRYABLE_STATUS_CODES = {502, 503, 504}
+IDEMPOTENT_METHODS = {"GET", "HEAD", "OPTIONS"}
+
+
+class CircuitOpenError(requests.RequestException):
+    # Levée lorsque le disjoncteur d'un service est ouvert : l'appel n'est pas tenté
+    pass
+
+
+class CircuitBreaker:
+    # Disjoncteur par service : après `failure_threshold` échecs consécutifs, les appels
+    # sont refusés pendant `reset_timeout` secondes, puis un seul appel d'essai est autorisé
+
+    def __init__(self, failure_threshold=CIRCUIT_FAILURE_THRESHOLD, reset_timeout=CIRCUIT_RESET_TIMEOUT):
+        self.failure_threshold = failure_threshold
+        self.reset_timeout = reset_timeout
+        self.failures = 0
+        self.opened_at = None
+        self.trial_in_progress = False
+        self.lock = threading.Lock()
+
+    def allow(self):
+        with self.lock:
+            if self.opened_at is None:
+                return True
+            if time.monotonic() - self.opened_at < self.reset_timeout or self.trial_in_progress:
+                return False
+            # Demi-ouvert : on laisse passer un appel d'essai
+            self.trial_in_progress = True
+            return True
+
+    def record_success(self):
+        with self.lock:
+            self.failures = 0
+            self.opened_at = None
+            self.trial_in_progress = False
+
+    def record_failure(self):
+        with self.lock:
+            self.failures += 1
+            self.trial_in_progress = False
+            if self.opened_at is not None or self.failures >= self.failure_threshold:
+                self.opened_at = time.monotonic()
+
+
+class ServiceClient:
+    # Client HTTP vers un service : connexions keep-alive dans un pool borné,
+    # timeouts de connexion/lecture, réessais bornés avec jitter et disjoncteur
+
+    def __init__(self, name, base_url, pool_maxsize=HTTP_POOL_MAXSIZE,
+                 connect_timeout=HTTP_CONNECT_TIMEOUT, read_timeout=HTTP_READ_TIMEOUT,
+                 max_retries=HTTP_MAX_RETRIES, retry_backoff=HTTP_RETRY_BACKOFF):
+        self.name = name
+        self.base_url = base_url.rstrip("/")
+        self.timeout = (connect_timeout, read_timeout)
+        self.max_retries = max_retries
+        self.retry_backoff = retry_backoff
+        self.breaker = CircuitBreaker()
+
+        self.session = requests.Session()
+        adapter = HTTPAdapter(pool_connections=1, pool_maxsize=pool_maxsize, pool_block=True, max_retries=0)
+        self.session.mount("http://", adapter)
+        self.session.mount("https://", adapter)
+
+    def request(self, method, path, retry=None, **kwargs):
+        # Envoie une requête au service ; les méthodes non idempotentes ne sont
+        # réessayées que si retry=True est passé explicitement
+        method = method.upper()
+        if retry is None:
+            retry = method in IDEMPOTENT_METHODS
+        attempts = 1 + (self.max_retries if retry else 0)
+        # En-têtes de l'appelant (dont Idempotency-Key), renvoyés à chaque essai
+        caller_headers = kwargs.pop("headers", None)
+        kwargs.setdefault("timeout", self.timeout)
+
+        for attempt in range(attempts):
+            if not self.breaker.allow():
+                CIRCUIT_OPEN.inc(self.name)
+                raise CircuitOpenError(f"Circuit ouvert pour le service {self.name}")
+            # Un span par tentative, propagé au service appelé par l'en-tête traceparent
+            span_id, headers = outgoing_headers(caller_headers)
+            started = time.perf_counter()
+            try:
+                response = self.session.request(method, f"{self.base_url}{path}", headers=headers, **kwargs)
+            except requests.RequestException:
+                DOWNSTREAM_DURATION.observe(time.perf_counter() - started, self.name, method, "error")
+                record_call(span_id, self.name, method, path, started, "error")
+                self.breaker.record_failure()
+                if attempt == attempts - 1:
+                    raise
+            else:
+                DOWNSTREAM_DURATION.observe(time.perf_counter() - started, self.name, method, str(response.status_code))
+                record_call(span_id, self.name, method, path, started, response.status_code)
+                if response.status_code not in RETRYABLE_STATUS_CODES:
+                    self.breaker.record_success()
+                    return response
+                self.breaker.record_failure()
+                if attempt == attempts - 1:
+                    return response
+            # Backoff exponentiel avec jitter complet
+            time.sleep(random.uniform(0, self.retry_backoff * (2 ** attempt)))
+
+    def get(self, path, **kwargs):
+        return self.request("GET", path, **kwargs)
+
+    def post(self, path, **kwargs):
+        return self.request("POST", path, **kwargs)
+
+    def get_json(self, path, cache):
+        # GET conditionnel : le JSON déjà reçu (conservé dans `cache` avec son ETag)
+        # est réutilisé si le service répond 304. Renvoie None si la réponse n'est pas 200
+        entry = cache.entry(path)
+        headers = {"If-None-Match": entry[0][0]} if entry else {}
+        response = self.get(path, headers=headers)
+        if response.status_code == 304 and entry:
+            return entry[0][1]
+        if response.status_code != 200:
+            return None
+        data = response.json()
+        if response.headers.get("ETag"):
+            cache.set(path, (response.headers["ETag"], data))
+        return data
@@ -0,0 +1,258 @@
+# Clés d'idempotence des routes d'écriture (en-tête Idempotency-Key).
+#
+# Un client qui réessaie un POST dont il n'a pas reçu la réponse (timeout, connexion
+# coupée) renvoie la même clé : la réponse enregistrée au premier essai est resservie
+# telle quelle (en-tête Idempotent-Replayed: true), sans nouvel appel aux autres
+# services ni nouvelle écriture. Les clés expirent IDEMPOTENCY_TTL secondes après la réponse.
+# En mode JSON (un seul processus), elles sont gardées dans un cache LRU borné
+# (IDEMPOTENCY_CACHE_SIZE) ; en mode MongoDB, gunicorn lance un worker par CPU et un essai
+# répété arrive en général sur un autre worker : elles sont gardées dans la collection
+# idempotency_keys du service (MongoIdempotencyKeys), partagée par tous les workers.
+#   - même clé avec un autre corps de requête : 422
+#   - même clé pendant que le premier essai est en cours : 409, à réessayer plus tard
+#   - les réponses 5xx ne sont pas enregistrées : un nouvel essai est traité normalement
+#   - sans en-tête, la route se comporte comme avant
+#
+#   @app.route("/bookings", methods=['POST'])
+#   @idempotency.idempotent
+#   def create_booking(): ...
+
+import hashlib
+import inspect
+import json
+import os
+from datetime import datetime, timedelta, timezone
+from functools import wraps
+
+from flask import Response, jsonify, make_response, request
+from pymongo import ASCENDING, IndexModel
+from pymongo.errors import DuplicateKeyError
+
+from common.cache import TTLCache
+
+IDEMPOTENCY_CACHE_SIZE = int(os.getenv("IDEMPOTENCY_CACHE_SIZE", "10000"))
+IDEMPOTENCY_TTL = float(os.getenv("IDEMPOTENCY_TTL", "86400"))
+# Durée de réservation d'une clé en mode MongoDB : un essai interrompu (worker arrêté
+# pendant la requête) libère sa clé après ce délai au lieu de IDEMPOTENCY_TTL
+IDEMPOTENCY_PENDING_TTL = float(os.getenv("IDEMPOTENCY_PENDING_TTL", "60"))
+
+IDEMPOTENCY_COLLECTION = "idempotency_keys"
+# Une clé par document (_id, unique) ; l'index TTL fait supprimer par MongoDB les clés expirées
+IDEMPOTENCY_INDEXES = [
+    IndexModel([("expires_at", ASCENDING)], expireAfterSeconds=0, name="expires_at_ttl"),
+]
+
+KEY_HEADER = "Idempotency-Key"
+REPLAYED_HEADER = "Idempotent-Replayed"
+MAX_KEY_LENGTH = 255
+# En-têtes recalculés à chaque réponse, donc non conservés
+UNSTORED_HEADERS = {"Content-Length", "Date"}
+
+
+def error_entry(status, message):
+    return status, json.dumps({"error": message}).encode(), [("Content-Type", "application/json")]
+
+
+def replayed(entry, fingerprint):
+    # Réponse à renvoyer pour une clé déjà réservée (entrée (empreinte, réponse) présente)
+    stored_fingerprint, stored = entry
+    if stored_fingerprint != fingerprint:
+        return error_entry(422, f"{KEY_HEADER} déjà utilisée pour une autre requête")
+    if stored is None:
+        return error_entry(409, f"Requête avec cette {KEY_HEADER} en cours de traitement")
+    status, body, headers = stored
+    return status, body, headers + [(REPLAYED_HEADER, "true")]
+
+
+def stored_response(status, body, headers):
+    # Réponse à enregistrer avec la clé, ou None pour une erreur serveur : la clé est alors
+    # libérée pour que le client puisse réessayer
+    if status >= 500:
+        return None
+    return status, body, [(name, value) for name, value in headers if name not in UNSTORED_HEADERS]
+
+
+async def resolved(value):
+    # Résultat d'une méthode du stockage des clés : immédiat (TTLCache) ou à attendre
+    # (AsyncMongoIdempotencyKeys)
+    return await value if inspect.isawaitable(value) else value
+
+
+class Idempotency:
+
+    def __init__(self, keys=None, maxsize=IDEMPOTENCY_CACHE_SIZE, ttl=IDEMPOTENCY_TTL):
+        # Entrées (empreinte du corps, réponse) ; réponse None tant que la requête est en cours.
+        # `keys` remplace le cache en mémoire (MongoIdempotencyKeys en mode MongoDB)
+        self.cache = keys if keys is not None else TTLCache(maxsize, ttl)
+
+    def claim(self, key, fingerprint):
+        # None si la requête doit être traitée (la clé lui est alors réservée), sinon la
+        # réponse (statut, corps, en-têtes) à renvoyer sans exécuter la route
+        entry = self.cache.add(key, (fingerprint, None))
+        return None if entry is None else replayed(entry, fingerprint)
+
+    def complete(self, key, fingerprint, status, body, headers):
+        # Enregistre la réponse de la requête qui a réservé la clé
+        stored = stored_response(status, body, headers)
+        if stored is None:
+            self.cache.invalidate(key)
+        else:
+            self.cache.set(key, (fingerprint, stored))
+
+    def idempotent(self, view):
+        @wraps(view)
+        def wrapper(*args, **kwargs):
+            key = request.headers.get(KEY_HEADER)
+            if key is None:
+                return view(*args, **kwargs)
+            if not key or len(key) > MAX_KEY_LENGTH:
+                return make_response(jsonify({"error": f"{KEY_HEADER} invalide (1 à {MAX_KEY_LENGTH} caractères)"}), 400)
+
+            key = scoped_key(request, key)
+            fingerprint = hashlib.sha1(request.get_data()).hexdigest()
+            stored = self.claim(key, fingerprint)
+            if stored is not None:
+                return Response(stored[1], status=stored[0], headers=stored[2])
+            try:
+                response = make_response(view(*args, **kwargs))
+            except BaseException:
+                self.cache.invalidate(key)
+                raise
+            self.complete(key, fingerprint, response.status_code, response.get_data(), list(response.headers))
+            return response
+        return wrapper
+
+    def idempotent_async(self, view):
+        # Équivalent de idempotent pour une route Quart (booking_async)
+        import quart
+
+        @wraps(view)
+        async def wrapper(*args, **kwargs):
+            key = quart.request.headers.get(KEY_HEADER)
+            if key is None:
+                return await view(*args, **kwargs)
+            if not key or len(key) > MAX_KEY_LENGTH:
+                return quart.jsonify({"error": f"{KEY_HEADER} invalide (1 à {MAX_KEY_LENGTH} caractères)"}), 400
+
+            key = scoped_key(quart.request, key)
+            fingerprint = hashlib.sha1(await quart.request.get_data()).hexdigest()
+            entry = await resolved(self.cache.add(key, (fingerprint, None)))
+            if entry is not None:
+                stored = replayed(entry, fingerprint)
+                return quart.Response(stored[1], status=stored[0], headers=stored[2])
+            try:
+                response = await quart.make_response(await view(*args, **kwargs))
+            except BaseException:
+                await resolved(self.cache.invalidate(key))
+                raise
+            stored = stored_response(response.status_code, await response.get_data(), list(response.headers.items()))
+            if stored is None:
+                await resolved(self.cache.invalidate(key))
+            else:
+                await resolved(self.cache.set(key, (fingerprint, stored)))
+            return response
+        return wrapper
+
+
+def scoped_key(request, key):
+    # Une même clé envoyée à deux routes différentes désigne deux requêtes différentes
+    return f"{request.method} {request.path} {key}"
+
+
+# ============================================================================
+# CLÉS PARTAGÉES PAR LES WORKERS (MODE MONGODB)
+# ============================================================================
+
+def key_document(key, value, ttl):
+    # Document d'une clé : {_id, fingerprint, response, expires_at} ; response None tant
+    # que la requête est en cours
+    fingerprint, stored = value
+    response = None
+    if stored is not None:
+        status, body, headers = stored
+        response = {"status": status, "body": body, "headers": [list(header) for header in headers]}
+    expires_at = datetime.now(timezone.utc) + timedelta(seconds=ttl)
+    return {"_id": key, "fingerprint": fingerprint, "response": response, "expires_at": expires_at}
+
+
+def key_entry(document):
+    # Entrée (empreinte, réponse) d'un document de clé
+    response = document["response"]
+    if response is None:
+        return document["fingerprint"], None
+    headers = [tuple(header) for header in response["headers"]]
+    return document["fingerprint"], (response["status"], bytes(response["body"]), headers)
+
+
+class MongoIdempotencyKeys:
+    # Clés d'idempotence dans une collection MongoDB, partagées par tous les workers ; mêmes
+    # méthodes que le TTLCache du mode JSON (add, set, invalidate). La collection est
+    # donnée par open(), une fois le client MongoDB créé
+
+    def __init__(self, ttl=IDEMPOTENCY_TTL, pending_ttl=IDEMPOTENCY_PENDING_TTL):
+        self.collection = None
+        self.ttl = ttl
+        self.pending_ttl = pending_ttl
+        # Réservations par résultat, exportées par /metrics
+        self.stats = {"hit": 0, "stale": 0, "miss": 0}
+
+    def open(self, collection):
+        self.collection = collection
+
+    def add(self, key, value):
+        # Réserve la clé (insertion, l'_id unique départage les workers) et renvoie None ;
+        # sinon renvoie l'entrée présente. Une clé expirée que l'index TTL n'a pas encore
+        # supprimée est remplacée
+        document = key_document(key, value, self.pending_ttl)
+        for _ in range(3):
+            try:
+                self.collection.insert_one(document)
+                self.stats["miss"] += 1
+                return None
+            except DuplicateKeyError:
+                pass
+            now = datetime.now(timezone.utc)
+            existing = self.collection.find_one({"_id": key, "expires_at": {"$gt": now}})
+            if existing is not None:
+                self.stats["hit"] += 1
+                return key_entry(existing)
+            if self.collection.replace_one({"_id": key, "expires_at": {"$lte": now}}, document).matched_count:
+                self.stats["stale"] += 1
+                return None
+        # Clé disputée par plusieurs essais simultanés : traitée comme en cours
+        return value[0], None
+
+    def set(self, key, value):
+        self.collection.replace_one({"_id": key}, key_document(key, value, self.ttl), upsert=True)
+
+    def invalidate(self, key):
+        self.collection.delete_one({"_id": key})
+
+
+class AsyncMongoIdempotencyKeys(MongoIdempotencyKeys):
+    # Équivalent de MongoIdempotencyKeys pour une collection AsyncMongoClient (booking_async)
+
+    async def add(self, key, value):
+        document = key_document(key, value, self.pending_ttl)
+        for _ in range(3):
+            try:
+                await self.collection.insert_one(document)
+                self.stats["miss"] += 1
+                return None
+            except DuplicateKeyError:
+                pass
+            now = datetime.now(timezone.utc)
+            existing = await self.collection.find_one({"_id": key, "expires_at": {"$gt": now}})
+            if existing is not None:
+                self.stats["hit"] += 1
+                return key_entry(existing)
+            if (await self.collection.replace_one({"_id": key, "expires_at": {"$lte": now}}, document)).matched_count:
+                self.stats["stale"] += 1
+                return None
+        return value[0], None
+
+    async def set(self, key, value):
+        await self.collection.replace_one({"_id": key}, key_document(key, value, self.ttl), upsert=True)
+
+    async def invalidate(self, key):
+        await self.collection.delete_one({"_id": key})
@@ -0,0 +1,201 @@
+# Persistance du mode JSON par journal en ajout seul (write-ahead log).
+#
+# Chaque mutation est ajoutée sous forme d'une ligne JSON au fichier `<snapshot>.log`
+# au lieu de réécrire tout le fichier. Le journal est compacté en arrière-plan dans
+# un nouveau snapshot (remplacé de façon atomique), et l'état est reconstruit au
+# démarrage en rejouant le snapshot puis le journal.
+
+import atexit
+import json
+import os
+import threading
+import time
+
+# Politique de synchronisation disque :
+#   group    : chaque écriture attend son fsync, les écritures concurrentes partagent le même fsync
+#   interval : fsync en arrière-plan toutes les JOURNAL_FSYNC_INTERVAL_MS millisecondes
+#   never    : aucune synchronisation explicite (laissée au système)
+FSYNC_POLICIES = ("group", "interval", "never")
+JOURNAL_FSYNC = os.getenv("JOURNAL_FSYNC", "group").lower()
+JOURNAL_FSYNC_INTERVAL_MS = int(os.getenv("JOURNAL_FSYNC_INTERVAL_MS", "50"))
+# Nombre d'entrées du journal au-delà duquel une compaction est lancée
+JOURNAL_COMPACT_THRESHOLD = int(os.getenv("JOURNAL_COMPACT_THRESHOLD", "10000"))
+
+
+class Journal:
+
+    def __init__(self, snapshot_path, root_key, key, fsync=JOURNAL_FSYNC,
+                 fsync_interval_ms=JOURNAL_FSYNC_INTERVAL_MS, compact_threshold=JOURNAL_COMPACT_THRESHOLD):
+        self.snapshot_path = snapshot_path
+        self.log_path = snapshot_path + ".log"
+        self.compacting_path = self.log_path + ".compacting"
+        self.root_key = root_key
+        self.key = key
+        # Une valeur inconnue (faute de frappe) ne doit pas désactiver silencieusement le fsync
+        if fsync not in FSYNC_POLICIES:
+            raise ValueError(f"JOURNAL_FSYNC invalide : {fsync!r} (attendu : {', '.join(FSYNC_POLICIES)})")
+        self.fsync = fsync
+        self.fsync_interval = fsync_interval_ms / 1000
+        self.compact_threshold = compact_threshold
+
+        self.lock = threading.Lock()
+        self.sync_lock = threading.Lock()
+        self.log = None
+        self.written_seq = 0
+        self.synced_seq = 0
+        self.entries_since_compaction = 0
+        self.compaction_thread = None
+
+    # ------------------------------------------------------------------------
+    # Démarrage
+    # ------------------------------------------------------------------------
+
+    def load(self):
+        # Reconstruit les documents à partir du snapshot et du journal, puis ouvre le journal en écriture
+        documents = self._read_snapshot()
+        # Un journal en cours de compaction lors d'un arrêt brutal est rejoué avant le journal courant
+        if os.path.exists(self.compacting_path):
+            self._replay(self.compacting_path, documents)
+        self.entries_since_compaction = self._replay(self.log_path, documents)
+
+        self.log = open(self.log_path, "a", encoding="utf-8")
+        if self.fsync == "interval":
+            threading.Thread(target=self._sync_periodically, name="journal-fsync", daemon=True).start()
+        # Arrêt du processus (fin d'un worker, SIGTERM) : les dernières écritures sont synchronisées
+        atexit.register(self.close)
+        return list(documents.values())
+
+    def _read_snapshot(self):
+        with open(self.snapshot_path, "r") as jsf:
+            return {str(document.get(self.key)): document for document in json.load(jsf)[self.root_key]}
+
+    def _replay(self, path, documents):
+        # Applique les entrées d'un journal ; une dernière ligne incomplète (écriture interrompue) est tronquée
+        if not os.path.exists(path):
+            return 0
+        count = 0
+        valid_size = 0
+        with open(path, "rb") as log:
+            for line in log:
+                try:
+                    entry = json.loads(line)
+                except ValueError:
+                    break
+                if entry["op"] == "put":
+                    documents[str(entry["doc"].get(self.key))] = entry["doc"]
+                else:
+                    documents.pop(entry["key"], None)
+                valid_size += len(line)
+                count += 1
+        if valid_size < os.path.getsize(path):
+            print(f"Journal {path} tronqué après {count} entrées valides")
+            with open(path, "r+b") as log:
+                log.truncate(valid_size)
+        return count
+
+    # ------------------------------------------------------------------------
+    # Écritures
+    # ------------------------------------------------------------------------
+
+    def put(self, document):
+        self.append([{"op": "put", "doc": document}])
+
+    def delete(self, key):
+        self.append([{"op": "del", "key": str(key)}])
+
+    def append(self, entries, wait=True):
+        # Ajoute plusieurs entrées au journal en une seule écriture. Avec wait=False, le
+        # fsync n'est pas attendu : l'appelant peut libérer ses verrous puis appeler
+        # wait(numéro renvoyé), pour partager le fsync avec les écritures concurrentes
+        data = "".join(json.dumps(entry, separators=(",", ":")) + "\n" for entry in entries)
+        with self.lock:
+            self.log.write(data)
+            self.log.flush()
+            self.written_seq += 1
+            seq = self.written_seq
+            self.entries_since_compaction += len(entries)
+            if self.entries_since_compaction >= self.compact_threshold:
+                self._start_compaction()
+        if wait:
+            self.wait(seq)
+        return seq
+
+    def wait(self, seq):
+        # Attend que l'écriture numéro `seq` soit sur disque (politique group)
+        if self.fsync == "group":
+            self._sync(seq)
+
+    def _sync(self, seq):
+        # Commit groupé : le premier écrivain synchronise le disque pour toutes les
+        # écritures déjà effectuées, les suivants n'ont plus rien à faire
+        with self.sync_lock:
+            if self.synced_seq >= seq:
+                return
+            with self.lock:
+                if self.log.closed:
+                    return
+                target = self.written_seq
+                # Descripteur dupliqué : le journal peut être basculé pendant le fsync
+                fd = os.dup(self.log.fileno())
+            try:
+                os.fsync(fd)
+            finally:
+                os.close(fd)
+            self.synced_seq = target
+
+    def close(self):
+        with self.lock:
+            if self.log is None or self.log.closed:
+                return
+            self.log.flush()
+            os.fsync(self.log.fileno())
+            self.log.close()
+
+    def _sync_periodically(self):
+        while True:
+            time.sleep(self.fsync_interval)
+            with self.lock:
+                seq = self.written_seq
+            if seq > self.synced_seq:
+                self._sync(seq)
+
+    # ------------------------------------------------------------------------
+    # Compaction
+    # ------------------------------------------------------------------------
+
+    def _start_compaction(self):
+        # Appelée sous self.lock : bascule sur un nouveau journal et compacte l'ancien en arrière-plan
+        if self.compaction_thread is not None and self.compaction_thread.is_alive():
+            return
+        # Un journal dont la compaction a échoué est d'abord compacté avant toute nouvelle bascule
+        if not os.path.exists(self.compacting_path):
+            os.fsync(self.log.fileno())
+            self.log.close()
+            os.replace(self.log_path, self.compacting_path)
+            self.log = open(self.log_path, "a", encoding="utf-8")
+            self.entries_since_compaction = 0
+        self.compaction_thread = threading.Thread(target=self._compact, name="journal-compaction", daemon=True)
+        self.compaction_thread.start()
+
+    def _compact(self):
+        # Le nouveau snapshot est calculé depuis le disque (snapshot + journal basculé),
+        # sans bloquer les écritures qui continuent dans le nouveau journal
+        documents = self._read_snapshot()
+        self._replay(self.compacting_path, documents)
+
+        tmp_path = self.snapshot_path + ".tmp"
+        with open(tmp_path, "w") as jsf:
+            json.dump({self.root_key: list(documents.values())}, jsf, indent=4)
+            jsf.flush()
+            os.fsync(jsf.fileno())
+        os.replace(tmp_path, self.snapshot_path)
+        self._sync_directory()
+        os.remove(self.compacting_path)
+
+    def _sync_directory(self):
+        if hasattr(os, "O_DIRECTORY"):
+            fd = os.open(os.path.dirname(os.path.abspath(self.snapshot_path)), os.O_RDONLY | os.O_DIRECTORY)
+            try:
+                os.fsync(fd)
+            finally:
+                os.close(fd)
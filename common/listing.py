@@ -0,0 +1,147 @@
+# Lecture des collections complètes : pagination par curseur, projection de champs
+# et sérialisation en flux (tableau JSON ou NDJSON), document par document.
+#
+# Paramètres de requête acceptés par les routes de liste :
+#   limit  : nombre maximal de documents (au plus MAX_PAGE_SIZE) ; l'en-tête
+#            X-Next-Cursor contient alors le jeton de la page suivante s'il en reste
+#   cursor : jeton opaque renvoyé par la page précédente
+#   fields : champs à renvoyer, séparés par des virgules
+#   format : json (par défaut) ou ndjson (un document par ligne)
+#   from, to : bornes incluses sur la clé de tri, pour les routes qui les acceptent
+#            (parse_listing(args, ranged=True)) ; la liste est alors triée par clé
+
+import base64
+import json
+import os
+
+from flask import Response, current_app
+
+MAX_PAGE_SIZE = int(os.getenv("MAX_PAGE_SIZE", "1000"))
+
+
+def encode_cursor(key):
+    return base64.urlsafe_b64encode(json.dumps(key).encode()).decode().rstrip("=")
+
+
+def decode_cursor(token):
+    try:
+        return json.loads(base64.urlsafe_b64decode(token + "=" * (-len(token) % 4)))
+    except ValueError:
+        raise ValueError("Paramètre 'cursor' invalide")
+
+
+def parse_listing(args, ranged=False):
+    # Lit les paramètres de liste ; lève ValueError si l'un d'eux est invalide
+    limit = args.get("limit")
+    if limit is not None:
+        if not limit.isdigit() or not 1 <= int(limit) <= MAX_PAGE_SIZE:
+            raise ValueError(f"Paramètre 'limit' invalide (entre 1 et {MAX_PAGE_SIZE})")
+        limit = int(limit)
+    fmt = args.get("format", "json")
+    if fmt not in ("json", "ndjson"):
+        raise ValueError("Paramètre 'format' invalide (json ou ndjson)")
+    low = (args.get("from") or None) if ranged else None
+    high = (args.get("to") or None) if ranged else None
+    if low is not None and high is not None and low > high:
+        raise ValueError("Paramètre 'from' postérieur à 'to'")
+    return {
+        "limit": limit,
+        "after": decode_cursor(args["cursor"]) if args.get("cursor") else None,
+        "fields": [field for field in args.get("fields", "").split(",") if field] or None,
+        "ndjson": fmt == "ndjson",
+        "from": low,
+        "to": high,
+    }
+
+
+def paginated(listing):
+    # Vrai si la liste doit être parcourue dans l'ordre des clés
+    return any(listing[name] is not None for name in ("limit", "after", "from", "to"))
+
+
+def key_bounds(listing):
+    # Conditions MongoDB sur la clé de tri : bornes from/to (incluses) et curseur (exclu)
+    bounds = {}
+    if listing["from"] is not None:
+        bounds["$gte"] = listing["from"]
+    if listing["to"] is not None:
+        bounds["$lte"] = listing["to"]
+    if listing["after"] is not None:
+        bounds["$gt"] = listing["after"]
+    return bounds
+
+
+def mongo_listing(collection, key, listing, hidden=(), query=None):
+    # Documents d'une collection MongoDB (filtrés par `query`), triés par `key` lorsqu'ils
+    # sont paginés ou bornés : un index commençant par les champs de `query` puis `key`
+    # rend le parcours O(log n + k). `_id` et les champs `hidden` sont exclus par projection
+    if listing["fields"]:
+        projection = {field: 1 for field in listing["fields"] if field not in hidden}
+        projection[key] = 1
+    else:
+        projection = {field: 0 for field in hidden}
+    projection["_id"] = 0
+
+    query = dict(query or {})
+    bounds = key_bounds(listing)
+    if bounds:
+        query[key] = bounds
+    cursor = collection.find(query, projection)
+    if not paginated(listing):
+        return cursor, None
+    cursor = cursor.sort(key, 1)
+    if listing["limit"] is None:
+        return cursor, None
+    documents = list(cursor.limit(listing["limit"] + 1))
+    if len(documents) > listing["limit"]:
+        documents = documents[:listing["limit"]]
+        return documents, documents[-1][key]
+    return documents, None
+
+
+def store_listing(store, listing, index=None, value=None):
+    # Documents d'un IndexedStore, ou ceux dont l'index ordonné `index` contient `value`,
+    # dans l'ordre des clés lorsqu'ils sont paginés ou bornés
+    if not paginated(listing):
+        documents = store.values() if index is None else store.find(index, value)
+        next_key = None
+    else:
+        limit = listing["limit"]
+        bounds = (listing["from"], listing["to"], listing["after"], None if limit is None else limit + 1)
+        keys = store.keys_between(*bounds) if index is None else store.index_keys(index, value, *bounds)
+        next_key = None
+        if limit is not None and len(keys) > limit:
+            keys = keys[:limit]
+            next_key = keys[-1]
+        documents = [store.get(key) for key in keys]
+        documents = [document for document in documents if document is not None]
+    if listing["fields"]:
+        fields = listing["fields"] + [store.key]
+        documents = ({field: document[field] for field in fields if field in document} for document in documents)
+    return documents, next_key
+
+
+def listing_response(documents, next_key, listing):
+    # Sérialise les documents un par un dans une réponse en flux
+    json_provider = current_app.json
+
+    def dumps(document):
+        return json_provider.dumps(document, separators=(",", ":"))
+
+    def generate_json():
+        yield "["
+        for i, document in enumerate(documents):
+            yield ("," if i else "") + dumps(document)
+        yield "]\n"
+
+    def generate_ndjson():
+        for document in documents:
+            yield dumps(document) + "\n"
+
+    if listing["ndjson"]:
+        response = Response(generate_ndjson(), status=200, mimetype="application/x-ndjson")
+    else:
+        response = Response(generate_json(), status=200, mimetype="application/json")
+    if next_key is not None:
+        response.headers["X-Next-Cursor"] = encode_cursor(next_key)
+    return response
@@ -0,0 +1,70 @@
+# Verrous partagés par les stockages en mémoire : verrou lecteurs-rédacteur et
+# verrous répartis par clé (striping)
+
+import threading
+import zlib
+from contextlib import contextmanager
+
+
+class RWLock:
+    # Plusieurs lecteurs simultanés ou un seul rédacteur ; un rédacteur en attente
+    # bloque les nouveaux lecteurs pour ne pas être affamé. Non réentrant
+
+    def __init__(self):
+        self.condition = threading.Condition(threading.Lock())
+        self.readers = 0
+        self.writing = False
+        self.waiting_writers = 0
+
+    @contextmanager
+    def read(self):
+        with self.condition:
+            while self.writing or self.waiting_writers:
+                self.condition.wait()
+            self.readers += 1
+        try:
+            yield
+        finally:
+            with self.condition:
+                self.readers -= 1
+                if not self.readers:
+                    self.condition.notify_all()
+
+    @contextmanager
+    def write(self):
+        with self.condition:
+            self.waiting_writers += 1
+            while self.writing or self.readers:
+                self.condition.wait()
+            self.waiting_writers -= 1
+            self.writing = True
+        try:
+            yield
+        finally:
+            with self.condition:
+                self.writing = False
+                self.condition.notify_all()
+
+
+class StripedLock:
+    # `stripes` verrous réentrants ; une clé est toujours associée au même verrou,
+    # deux clés différentes le sont le plus souvent à des verrous différents
+
+    def __init__(self, stripes=64):
+        self.locks = [threading.RLock() for _ in range(stripes)]
+
+    def stripe(self, key):
+        return zlib.crc32(str(key).encode()) % len(self.locks)
+
+    @contextmanager
+    def locked(self, *keys):
+        # Verrouille les clés données ; les verrous sont pris dans un ordre fixe
+        # pour que deux appels sur les mêmes clés ne puissent pas s'interbloquer
+        stripes = sorted({self.stripe(key) for key in keys})
+        for stripe in stripes:
+            self.locks[stripe].acquire()
+        try:
+            yield
+        finally:
+            for stripe in reversed(stripes):
+                self.locks[stripe].release()
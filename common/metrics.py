@@ -0,0 +1,259 @@
+# Métriques des services au format texte Prometheus, et sondes de santé.
+#
+# instrument(app, startup) ajoute à une application Flask :
+#   - /healthz : le processus répond (sonde de vivacité)
+#   - /readyz  : la base est initialisée (sonde de disponibilité, 503 sinon)
+#   - /metrics : durée des requêtes par route, réponses par code de statut, requêtes
+#                en cours, durée des appels aux autres services et des commandes
+#                MongoDB, taux de succès des caches
+#
+# Chaque mesure ne coûte qu'un bisect et une addition sous un verrou propre à la
+# métrique ; le texte n'est produit qu'à la lecture de /metrics. Avec gunicorn, chaque
+# worker a ses propres compteurs : /metrics renvoie ceux du worker qui répond.
+
+import bisect
+import threading
+import time
+
+from flask import Response, g, jsonify, make_response, request
+from pymongo import monitoring
+
+# Bornes (en secondes) des histogrammes de durée
+DEFAULT_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+# Routes toujours servies, même pendant l'initialisation de la base
+PROBE_ENDPOINTS = ("healthz", "readyz", "metrics")
+CONTENT_TYPE = "text/plain; version=0.0.4; charset=utf-8"
+
+
+def escape(value):
+    return str(value).replace("\\", "\\\\").replace("\"", "\\\"").replace("\n", "\\n")
+
+
+def format_labels(names, values, extra=()):
+    pairs = list(zip(names, values)) + list(extra)
+    if not pairs:
+        return ""
+    return "{" + ",".join(f'{name}="{escape(value)}"' for name, value in pairs) + "}"
+
+
+def format_value(value):
+    return repr(float(value)) if isinstance(value, float) else str(value)
+
+
+class Counter:
+    # Valeur croissante par combinaison de labels
+    kind = "counter"
+
+    def __init__(self, name, description, labelnames=()):
+        self.name = name
+        self.description = description
+        self.labelnames = labelnames
+        self.values = {}
+        self.lock = threading.Lock()
+
+    def inc(self, *labels, amount=1):
+        with self.lock:
+            self.values[labels] = self.values.get(labels, 0) + amount
+
+    def render(self):
+        with self.lock:
+            values = list(self.values.items())
+        return [f"{self.name}{format_labels(self.labelnames, labels)} {format_value(value)}" for labels, value in values]
+
+
+class Gauge(Counter):
+    # Valeur pouvant augmenter ou diminuer (requêtes en cours, ...)
+    kind = "gauge"
+
+    def dec(self, *labels, amount=1):
+        self.inc(*labels, amount=-amount)
+
+
+class Histogram:
+    # Répartition des valeurs observées dans des intervalles cumulés, avec somme et nombre
+    kind = "histogram"
+
+    def __init__(self, name, description, labelnames=(), buckets=DEFAULT_BUCKETS):
+        self.name = name
+        self.description = description
+        self.labelnames = labelnames
+        self.buckets = tuple(buckets)
+        # labels -> [effectifs par intervalle (dernier : +Inf), somme]
+        self.values = {}
+        self.lock = threading.Lock()
+
+    def observe(self, value, *labels):
+        index = bisect.bisect_left(self.buckets, value)
+        with self.lock:
+            series = self.values.get(labels)
+            if series is None:
+                series = self.values[labels] = [[0] * (len(self.buckets) + 1), 0.0]
+            series[0][index] += 1
+            series[1] += value
+
+    def render(self):
+        with self.lock:
+            values = [(labels, list(counts), total) for labels, (counts, total) in self.values.items()]
+        lines = []
+        for labels, counts, total in values:
+            cumulative = 0
+            for bound, count in zip(self.buckets + ("+Inf",), counts):
+                cumulative += count
+                le = bound if bound == "+Inf" else format_value(float(bound))
+                lines.append(f"{self.name}_bucket{format_labels(self.labelnames, labels, [('le', le)])} {cumulative}")
+            lines.append(f"{self.name}_sum{format_labels(self.labelnames, labels)} {format_value(total)}")
+            lines.append(f"{self.name}_count{format_labels(self.labelnames, labels)} {cumulative}")
+        return lines
+
+
+class CacheStats:
+    # Statistiques lues sur les TTLCache enregistrés au moment de l'export
+    kind = "counter"
+    name = "cache_requests_total"
+    description = "Lectures des caches par résultat (hit, stale, miss)"
+
+    def __init__(self):
+        self.caches = {}
+
+    def register(self, name, cache):
+        self.caches[name] = cache
+
+    def render(self):
+        lines = []
+        for name, cache in self.caches.items():
+            for result in ("hit", "stale", "miss"):
+                lines.append(f'{self.name}{{cache="{escape(name)}",result="{result}"}} {cache.stats[result]}')
+        return lines
+
+
+class Registry:
+
+    def __init__(self):
+        self.metrics = []
+
+    def register(self, metric):
+        self.metrics.append(metric)
+        return metric
+
+    def render(self):
+        lines = []
+        for metric in self.metrics:
+            lines.append(f"# HELP {metric.name} {metric.description}")
+            lines.append(f"# TYPE {metric.name} {metric.kind}")
+            lines += metric.render()
+        return "\n".join(lines) + "\n"
+
+
+registry = Registry()
+REQUEST_DURATION = registry.register(Histogram(
+    "http_request_duration_seconds", "Durée de traitement des requêtes par route", ("method", "route")))
+RESPONSES = registry.register(Counter(
+    "http_responses_total", "Réponses par route et code de statut", ("method", "route", "status")))
+IN_FLIGHT = registry.register(Gauge(
+    "http_requests_in_flight", "Requêtes en cours de traitement"))
+DOWNSTREAM_DURATION = registry.register(Histogram(
+    "downstream_request_seconds", "Durée des appels aux autres services (par tentative)", ("service", "method", "status")))
+CIRCUIT_OPEN = registry.register(Counter(
+    "downstream_circuit_open_total", "Appels refusés par le disjoncteur d'un service", ("service",)))
+MONGO_DURATION = registry.register(Histogram(
+    "mongo_command_seconds", "Durée des commandes MongoDB", ("command", "outcome")))
+CACHES = registry.register(CacheStats())
+
+
+class MongoCommandMetrics(monitoring.CommandListener):
+    # À passer à MongoClient(event_listeners=[...]) : mesure chaque commande envoyée au serveur
+
+    def started(self, event):
+        pass
+
+    def succeeded(self, event):
+        MONGO_DURATION.observe(event.duration_micros / 1e6, event.command_name, "ok")
+
+    def failed(self, event):
+        MONGO_DURATION.observe(event.duration_micros / 1e6, event.command_name, "error")
+
+
+def route_label(request):
+    # Modèle de la route (borné en nombre) plutôt que le chemin demandé
+    return request.url_rule.rule if request.url_rule is not None else "<unmatched>"
+
+
+def instrument(app, startup, caches=None):
+    # Mesure les requêtes de `app` et ajoute /healthz, /readyz et /metrics ; à appeler
+    # avant d'enregistrer les autres before_request pour que toutes les requêtes soient mesurées
+    for name, cache in (caches or {}).items():
+        CACHES.register(name, cache)
+
+    @app.before_request
+    def start_timer():
+        g.request_started = time.perf_counter()
+        IN_FLIGHT.inc()
+
+    @app.after_request
+    def record_request(response):
+        started = g.get("request_started")
+        if started is not None:
+            route = route_label(request)
+            REQUEST_DURATION.observe(time.perf_counter() - started, request.method, route)
+            RESPONSES.inc(request.method, route, str(response.status_code))
+        return response
+
+    @app.teardown_request
+    def stop_timer(exc=None):
+        if g.pop("request_started", None) is not None:
+            IN_FLIGHT.dec()
+
+    @app.route("/healthz", methods=['GET'])
+    def healthz():
+        return make_response(jsonify({"status": "ok"}), 200)
+
+    @app.route("/readyz", methods=['GET'])
+    def readyz():
+        if startup.ready.is_set():
+            return make_response(jsonify({"status": "ready"}), 200)
+        return make_response(jsonify({"status": "starting", "error": startup.error}), 503)
+
+    @app.route("/metrics", methods=['GET'])
+    def metrics():
+        return Response(registry.render(), status=200, content_type=CONTENT_TYPE)
+
+
+def instrument_async(app, startup, caches=None):
+    # Équivalent de instrument pour une application Quart (booking_async)
+    import quart
+
+    for name, cache in (caches or {}).items():
+        CACHES.register(name, cache)
+
+    @app.before_request
+    async def start_timer():
+        quart.g.request_started = time.perf_counter()
+        IN_FLIGHT.inc()
+
+    @app.after_request
+    async def record_request(response):
+        started = quart.g.get("request_started")
+        if started is not None:
+            route = route_label(quart.request)
+            REQUEST_DURATION.observe(time.perf_counter() - started, quart.request.method, route)
+            RESPONSES.inc(quart.request.method, route, str(response.status_code))
+        return response
+
+    @app.teardown_request
+    async def stop_timer(exc=None):
+        if quart.g.pop("request_started", None) is not None:
+            IN_FLIGHT.dec()
+
+    @app.route("/healthz", methods=['GET'])
+    async def healthz():
+        return quart.jsonify({"status": "ok"}), 200
+
+    @app.route("/readyz", methods=['GET'])
+    async def readyz():
+        if startup.ready.is_set():
+            return quart.jsonify({"status": "ready"}), 200
+        return quart.jsonify({"status": "starting", "error": startup.error}), 503
+
+    @app.route("/metrics", methods=['GET'])
+    async def metrics():
+        return quart.Response(registry.render(), status=200, content_type=CONTENT_TYPE)
@@ -0,0 +1,103 @@
+# Index MongoDB requis par les services et rapport d'utilisation des index.
+#
+# Chaque service déclare ses index (liste d'IndexModel) et ses requêtes fréquentes ;
+# les index sont créés au démarrage, et la route /admin/indexes exécute `explain`
+# sur chaque requête fréquente pour vérifier qu'aucune ne parcourt toute la collection.
+#
+# Utilisation en ligne de commande (code de sortie non nul si une requête fait un COLLSCAN) :
+#   python -m common.mongo_indexes http://localhost:3200 http://localhost:3201 ...
+
+import sys
+
+import requests
+from pymongo.errors import OperationFailure
+
+
+def ensure_indexes(collection, indexes):
+    # Crée les index manquants (sans effet s'ils existent déjà), un par un. Un index
+    # simple impossible à créer est signalé ; un index unique manquant lève une erreur,
+    # qui fait échouer l'initialisation : les écritures atomiques s'appuient sur lui
+    failures = []
+    for index in indexes:
+        try:
+            collection.create_indexes([index])
+        except OperationFailure as e:
+            failures.append(index_failure(collection, index, e))
+    raise_unique_failures(failures)
+
+
+def index_failure(collection, index, error):
+    # Par exemple des doublons existants empêchant un index unique
+    name = index.document["name"]
+    print(f"Impossible de créer l'index {name} de {collection.full_name}: {error}")
+    return name, index.document.get("unique", False), error
+
+
+def raise_unique_failures(failures):
+    unique = [f"{name} ({error})" for name, is_unique, error in failures if is_unique]
+    if unique:
+        raise RuntimeError(f"Index uniques manquants : {', '.join(unique)}")
+
+
+def plan_stages(plan):
+    # Liste des étapes (COLLSCAN, IXSCAN, FETCH, ...) d'un plan d'exécution
+    stages = [plan.get("stage")]
+    for child in [plan.get("inputStage")] + plan.get("inputStages", []):
+        if child:
+            stages += plan_stages(child)
+    return stages
+
+
+def report_entry(name, explanation):
+    winning_plan = explanation["queryPlanner"]["winningPlan"]
+    # Les plans du moteur SBE sont encapsulés dans queryPlan
+    stages = [stage for stage in plan_stages(winning_plan.get("queryPlan", winning_plan)) if stage]
+    return {
+        "query": name,
+        "stages": stages,
+        "collscan": "COLLSCAN" in stages
+    }
+
+
+def hot_query_cursor(collection, query):
+    cursor = collection.find(query["filter"], collation=query.get("collation"))
+    if query.get("sort"):
+        cursor = cursor.sort(query["sort"])
+    return cursor
+
+
+def index_report(collection, queries):
+    # Exécute explain sur chaque requête fréquente ; queries associe un nom à
+    # un dictionnaire {"filter": ..., "collation": ..., "sort": ...}
+    return [report_entry(name, hot_query_cursor(collection, query).explain()) for name, query in queries.items()]
+
+
+async def ensure_indexes_async(collection, indexes):
+    # Équivalent de ensure_indexes pour une collection AsyncMongoClient
+    failures = []
+    for index in indexes:
+        try:
+            await collection.create_indexes([index])
+        except OperationFailure as e:
+            failures.append(index_failure(collection, index, e))
+    raise_unique_failures(failures)
+
+
+async def index_report_async(collection, queries):
+    # Équivalent de index_report pour une collection AsyncMongoClient
+    return [report_entry(name, await hot_query_cursor(collection, query).explain()) for name, query in queries.items()]
+
+
+def main(urls):
+    failed = False
+    for url in urls:
+        response = requests.get(f"{url.rstrip('/')}/admin/indexes", timeout=10)
+        for query in response.json().get("queries", []):
+            status = "COLLSCAN" if query["collscan"] else "ok"
+            print(f"{url} {query['query']}: {status} ({' > '.join(query['stages'])})")
+        failed = failed or response.status_code != 200
+    return 1 if failed else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main(sys.argv[1:]))
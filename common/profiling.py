@@ -0,0 +1,114 @@
+# Profilage de requêtes choisies, sans relancer le service sous un profileur.
+#
+# Une requête est profilée avec cProfile si :
+#   - elle porte l'en-tête `X-Profile: <PROFILE_TOKEN>` (désactivé si PROFILE_TOKEN est vide), ou
+#   - elle est tirée au sort (PROFILE_SAMPLE_RATIO, 0 par défaut).
+# Le profil est écrit dans PROFILE_DIR (<service>-<méthode>-<route>-<horodatage>.prof) et
+# son nom est renvoyé dans l'en-tête `X-Profile-File`. Une seule requête est profilée à
+# la fois par processus ; les autres sont servies normalement. Pour booking_async
+# (profile_requests_async), le profileur suit la boucle d'événements : le profil
+# contient aussi les autres requêtes traitées par la boucle pendant la requête profilée.
+#
+#   python -m pstats /tmp/profiles/booking-GET-bookings_userid_detailed-1700000000123.prof
+
+import cProfile
+import os
+import random
+import re
+import threading
+import time
+
+from flask import g, request
+
+from common.metrics import route_label
+
+PROFILE_SAMPLE_RATIO = float(os.getenv("PROFILE_SAMPLE_RATIO", "0"))
+PROFILE_TOKEN = os.getenv("PROFILE_TOKEN", "")
+PROFILE_DIR = os.getenv("PROFILE_DIR", "/tmp/profiles")
+
+# cProfile ne peut suivre qu'une requête à la fois
+profiler_lock = threading.Lock()
+
+
+def wants_profile(headers):
+    if PROFILE_TOKEN and headers.get("X-Profile") == PROFILE_TOKEN:
+        return True
+    return PROFILE_SAMPLE_RATIO > 0 and random.random() < PROFILE_SAMPLE_RATIO
+
+
+def profile_path(service, method, route):
+    name = re.sub(r"[^A-Za-z0-9]+", "_", route).strip("_") or "root"
+    return os.path.join(PROFILE_DIR, f"{service}-{method}-{name}-{int(time.time() * 1000)}.prof")
+
+
+def profile_requests(app, service):
+    # Profile les requêtes choisies de `app` (Flask)
+
+    @app.before_request
+    def start_profile():
+        profiler = start_profiler(request.headers)
+        if profiler is not None:
+            g.profiler = profiler
+            g.profile_path = profile_path(service, request.method, route_label(request))
+
+    @app.after_request
+    def name_profile(response):
+        if "profile_path" in g:
+            response.headers["X-Profile-File"] = os.path.basename(g.profile_path)
+        return response
+
+    @app.teardown_request
+    def write_profile(exc=None):
+        finish_profile(g)
+
+
+def profile_requests_async(app, service):
+    # Équivalent de profile_requests pour une application Quart (booking_async)
+    import quart
+
+    @app.before_request
+    async def start_profile():
+        req = quart.request
+        profiler = start_profiler(req.headers)
+        if profiler is not None:
+            quart.g.profiler = profiler
+            quart.g.profile_path = profile_path(service, req.method, route_label(req))
+
+    @app.after_request
+    async def name_profile(response):
+        if "profile_path" in quart.g:
+            response.headers["X-Profile-File"] = os.path.basename(quart.g.profile_path)
+        return response
+
+    @app.teardown_request
+    async def write_profile(exc=None):
+        finish_profile(quart.g)
+
+
+def start_profiler(headers):
+    # Profileur démarré pour une requête choisie, ou None
+    if not wants_profile(headers) or not profiler_lock.acquire(blocking=False):
+        return None
+    profiler = cProfile.Profile()
+    try:
+        profiler.enable()
+    except ValueError:
+        # Un autre profileur est déjà actif dans le processus
+        profiler_lock.release()
+        return None
+    return profiler
+
+
+def finish_profile(context):
+    # Arrête le profileur de la requête (`context` : g de Flask ou de Quart) et écrit son profil
+    profiler = context.pop("profiler", None)
+    if profiler is None:
+        return
+    try:
+        profiler.disable()
+        os.makedirs(PROFILE_DIR, exist_ok=True)
+        profiler.dump_stats(context.pop("profile_path"))
+    except OSError as e:
+        print(f"Écriture du profil impossible: {e}")
+    finally:
+        profiler_lock.release()
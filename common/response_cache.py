@@ -0,0 +1,75 @@
+# Cache des réponses des routes de lecture, par chemin et paramètres de requête.
+#
+# Les réponses 200 mises en cache sont resservies sans nouvel accès aux données ni
+# nouvelle sérialisation, avec un ETag fort (empreinte du corps) et un en-tête
+# Cache-Control ; une requête conditionnelle (If-None-Match) reçoit un 304 sans corps.
+# Tout le cache est vidé après chaque écriture réussie. Les réponses en flux (listes
+# complètes, NDJSON) ne sont jamais mises en cache et restent envoyées au fil de l'eau.
+#
+#   @app.route("/movies/<movieid>", methods=['GET'])
+#   @response_cache.cached
+#   def get_movie_by_id(movieid): ...
+#
+#   @app.route("/movies/<movieid>", methods=['DELETE'])
+#   @response_cache.invalidates
+#   def delete_movie(movieid): ...
+
+import hashlib
+import os
+from functools import wraps
+
+from flask import Response, make_response, request
+
+from common.cache import TTLCache
+
+RESPONSE_CACHE_SIZE = int(os.getenv("RESPONSE_CACHE_SIZE", "512"))
+RESPONSE_CACHE_TTL = float(os.getenv("RESPONSE_CACHE_TTL", "60"))
+# Durée pendant laquelle un client peut réutiliser une réponse sans la revalider
+# (0 : revalidation systématique par If-None-Match)
+RESPONSE_CACHE_MAX_AGE = int(os.getenv("RESPONSE_CACHE_MAX_AGE", "0"))
+
+# En-têtes recalculés à chaque réponse, donc non conservés en cache
+UNCACHED_HEADERS = {"Content-Length", "ETag", "Cache-Control", "Date"}
+
+
+class ResponseCache:
+
+    def __init__(self, maxsize=RESPONSE_CACHE_SIZE, ttl=RESPONSE_CACHE_TTL, max_age=RESPONSE_CACHE_MAX_AGE):
+        self.cache = TTLCache(maxsize, ttl)
+        self.cache_control = f"public, max-age={max_age}" if max_age else "no-cache"
+
+    def cached(self, view):
+        @wraps(view)
+        def wrapper(*args, **kwargs):
+            key = request.full_path
+            entry = self.cache.get(key)
+            if entry is None:
+                generation = self.cache.generation
+                response = make_response(view(*args, **kwargs))
+                # Les listes envoyées en flux (listing_response) ne sont ni lues ni mises en
+                # cache : les mettre en mémoire annulerait leur coût mémoire borné
+                if response.status_code != 200 or response.is_streamed:
+                    return response
+                body = response.get_data()
+                headers = [(name, value) for name, value in response.headers if name not in UNCACHED_HEADERS]
+                entry = (body, headers, hashlib.sha1(body).hexdigest())
+                self.cache.set(key, entry, generation)
+
+            body, headers, etag = entry
+            response = Response(body, status=200, headers=headers)
+            response.set_etag(etag)
+            response.headers["Cache-Control"] = self.cache_control
+            return response.make_conditional(request)
+        return wrapper
+
+    def invalidates(self, view):
+        @wraps(view)
+        def wrapper(*args, **kwargs):
+            response = make_response(view(*args, **kwargs))
+            if response.status_code < 400:
+                self.cache.clear()
+            return response
+        return wrapper
+
+    def clear(self):
+        self.cache.clear()
@@ -0,0 +1,107 @@
+# Initialisation de la base en arrière-plan et chargement des données initiales.
+#
+# L'import d'un service ne touche plus MongoDB : le client est créé sans se connecter,
+# puis la création des index et le chargement des données initiales sont faits dans un
+# thread (ou une tâche asyncio) réessayé tant que MongoDB est injoignable. Les routes
+# de données répondent 503 jusqu'à ce que `ready` soit levé.
+#
+# Les données initiales ne sont chargées que si la collection est vide (sondage
+# estimated_document_count, sans parcours) et par des upserts $setOnInsert non
+# ordonnés sur la clé unique : relancer le chargement, ou le lancer depuis plusieurs
+# réplicas démarrant en même temps, n'insère jamais un document en double.
+
+import asyncio
+import os
+import threading
+import time
+
+from pymongo import UpdateOne
+from pymongo.errors import BulkWriteError
+
+STARTUP_RETRY_DELAY = float(os.getenv("STARTUP_RETRY_DELAY", "2"))
+
+
+def seed_operations(documents, keys):
+    # Un upsert par document, identifié par ses champs `keys` ; un document existant n'est pas modifié
+    return [
+        UpdateOne({key: document[key] for key in keys}, {"$setOnInsert": document}, upsert=True)
+        for document in documents
+    ]
+
+
+def seed_collection(collection, documents, keys):
+    # Charge `documents` si la collection est vide ; renvoie le nombre de documents
+    # insérés, ou None si la collection contenait déjà des données
+    if collection.estimated_document_count() > 0:
+        return None
+    if not documents:
+        return 0
+    try:
+        return collection.bulk_write(seed_operations(documents, keys), ordered=False).upserted_count
+    except BulkWriteError as e:
+        # Upsert concurrent d'un autre réplica sur la même clé : le document existe déjà
+        return e.details["nUpserted"]
+
+
+async def seed_collection_async(collection, documents, keys):
+    # Équivalent de seed_collection pour une collection AsyncMongoClient
+    if await collection.estimated_document_count() > 0:
+        return None
+    if not documents:
+        return 0
+    try:
+        return (await collection.bulk_write(seed_operations(documents, keys), ordered=False)).upserted_count
+    except BulkWriteError as e:
+        return e.details["nUpserted"]
+
+
+class Startup:
+    # État d'initialisation d'un service : `ready` est levé une fois la base prête,
+    # `error` garde la dernière erreur rencontrée pendant l'initialisation
+
+    def __init__(self, retry_delay=STARTUP_RETRY_DELAY):
+        self.retry_delay = retry_delay
+        self.ready = threading.Event()
+        self.error = None
+
+    def start(self, initialize):
+        # Lance `initialize` dans un thread, réessayé jusqu'à ce qu'il réussisse
+        threading.Thread(target=self._run, args=(initialize,), name="startup", daemon=True).start()
+
+    def mark_ready(self):
+        self.error = None
+        self.ready.set()
+
+    def failed(self, error):
+        self.error = str(error)
+        print(f"Initialisation de la base impossible ({error}), nouvel essai dans {self.retry_delay}s")
+
+    def _run(self, initialize):
+        while True:
+            try:
+                initialize()
+            except Exception as e:
+                self.failed(e)
+                time.sleep(self.retry_delay)
+            else:
+                self.mark_ready()
+                return
+
+
+class AsyncStartup(Startup):
+    # Même état, initialisé par une coroutine dans la boucle d'événements du serveur
+    task = None
+
+    def start(self, initialize):
+        self.task = asyncio.get_running_loop().create_task(self._run(initialize))
+
+    async def _run(self, initialize):
+        while True:
+            try:
+                await initialize()
+            except Exception as e:
+                self.failed(e)
+                await asyncio.sleep(self.retry_delay)
+            else:
+                self.mark_ready()
+                return
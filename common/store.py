@@ -0,0 +1,259 @@
+# Stockage en mémoire du mode JSON : documents indexés par clé primaire,
+# avec des index secondaires maintenus à chaque écriture et, si un journal
+# est ouvert, chaque mutation persistée dans ce journal.
+#
+# Accès concurrents : les structures (documents, clés triées, index) sont protégées
+# par un verrou lecteurs-rédacteur, tenu seulement le temps de les lire ou de les
+# modifier. Les documents stockés ne sont jamais modifiés en place : une écriture
+# remplace le document par une nouvelle version (copy() puis put(), ou update()).
+# Les lectures-modifications-écritures d'une même clé sont sérialisées par
+# locked(key), des verrous répartis par clé qui laissent les écritures sur des clés
+# différentes progresser en parallèle.
+
+import copy
+from bisect import bisect_left, bisect_right, insort
+
+from common.locks import RWLock, StripedLock
+
+
+class IndexedStore:
+    # Collection de documents indexée par `key` (comparée sous forme de chaîne).
+    # `indexes` associe un nom d'index à une fonction qui renvoie la liste des
+    # valeurs indexées pour un document (plusieurs valeurs = index multiclé).
+    # Les index nommés dans `ordered` gardent les clés de chaque valeur triées, pour
+    # les parcours par plage (index_keys) ; ceux nommés dans `ranged` gardent leurs
+    # valeurs distinctes triées, pour les recherches par préfixe (find_prefix)
+
+    def __init__(self, key, documents=(), indexes=None, ordered=(), ranged=(), stripes=64):
+        self.key = key
+        self.index_functions = indexes or {}
+        self.ordered = set(ordered)
+        self.ranged = set(ranged)
+        self.journal = None
+        self.lock = RWLock()
+        self.key_locks = StripedLock(stripes)
+        self.load(documents)
+
+    def open(self, journal):
+        # Charge l'état persisté par le journal et y enregistre les mutations suivantes
+        self.journal = journal
+        self.load(journal.load())
+
+    def load(self, documents):
+        # Remplace tout le contenu de la collection
+        with self.lock.write():
+            self._load(documents)
+
+    def _load(self, documents):
+        self.documents = {}
+        # Clés primaires triées, pour les parcours paginés dans l'ordre des clés
+        self.sorted_keys = []
+        self.indexes = {name: {} for name in self.index_functions}
+        # Valeurs actuellement indexées pour chaque document, afin de pouvoir
+        # retirer les anciennes entrées après une modification en place
+        self.indexed_values = {name: {} for name in self.index_functions}
+        self.sorted_values = {name: [] for name in self.ranged}
+        for document in documents:
+            self._put(document, keep_sorted=False)
+        self.sorted_keys = sorted(self.documents)
+        self.sorted_values = {name: sorted(self.indexes[name]) for name in self.ranged}
+
+    def __len__(self):
+        return len(self.documents)
+
+    def __contains__(self, key):
+        return str(key) in self.documents
+
+    def values(self):
+        with self.lock.read():
+            return list(self.documents.values())
+
+    def get(self, key):
+        # Document stocké, à ne pas modifier (voir copy)
+        return self.documents.get(str(key))
+
+    def copy(self, key):
+        # Copie modifiable d'un document, à enregistrer ensuite avec put()
+        document = self.documents.get(str(key))
+        return None if document is None else copy.deepcopy(document)
+
+    def locked(self, *keys):
+        # Sérialise les lectures-modifications-écritures portant sur ces clés
+        return self.key_locks.locked(*(str(key) for key in keys))
+
+    def keys_after(self, after=None, limit=None):
+        # Clés strictement supérieures à `after`, dans l'ordre croissant
+        return self.keys_between(after=after, limit=limit)
+
+    def keys_between(self, low=None, high=None, after=None, limit=None):
+        # Clés comprises entre `low` et `high` (inclus) et strictement supérieures à
+        # `after`, dans l'ordre croissant : O(log n + k)
+        with self.lock.read():
+            return key_range(self.sorted_keys, low, high, after, limit)
+
+    def index_keys(self, index, value, low=None, high=None, after=None, limit=None):
+        # Équivalent de keys_between pour les documents dont l'index ordonné `index`
+        # contient la valeur `value`
+        with self.lock.read():
+            return key_range(self.indexes[index].get(value, []), low, high, after, limit)
+
+    def find(self, index, value):
+        # Documents dont l'index `index` contient la valeur `value`
+        with self.lock.read():
+            return [self.documents[key] for key in self.indexes[index].get(value, ())]
+
+    def count(self, index, value):
+        # Nombre de documents dont l'index `index` contient la valeur `value`
+        with self.lock.read():
+            return len(self.indexes[index].get(value, ()))
+
+    def exists(self, index, value):
+        # Vrai si un document a la valeur `value` dans l'index `index` ; sans verrou, comme
+        # get : une seule lecture de dictionnaire, atomique
+        return bool(self.indexes[index].get(value))
+
+    def find_prefix(self, index, prefix, limit=None):
+        # Documents dont une valeur de l'index `index` (déclaré dans `ranged`) commence par
+        # `prefix`, dans l'ordre des valeurs puis des clés : O(log n + k)
+        with self.lock.read():
+            values = self.sorted_values[index]
+            documents = []
+            for position in range(bisect_left(values, prefix), len(values)):
+                value = values[position]
+                if not value.startswith(prefix):
+                    break
+                for key in sorted(self.indexes[index][value]):
+                    documents.append(self.documents[key])
+                    if len(documents) == limit:
+                        return documents
+            return documents
+
+    def find_one(self, index, value):
+        with self.lock.read():
+            for key in self.indexes[index].get(value, ()):
+                return self.documents[key]
+        return None
+
+    def put(self, document):
+        # Insère ou remplace un document
+        key = str(document.get(self.key))
+        # Le journal est écrit sous le verrou de la clé (même ordre qu'en mémoire)
+        # mais hors du verrou des structures, pour ne pas bloquer les lectures pendant le fsync
+        with self.locked(key):
+            with self.lock.write():
+                self._put(document)
+            if self.journal:
+                self.journal.put(document)
+        return document
+
+    def put_many(self, documents):
+        # Insère ou remplace plusieurs documents, journalisés en un seul lot (une écriture
+        # et un fsync) ; les clés doivent déjà être verrouillées par l'appelant (locked)
+        if not documents:
+            return documents
+        with self.lock.write():
+            for document in documents:
+                self._put(document)
+        if self.journal:
+            self.journal.append([{"op": "put", "doc": document} for document in documents])
+        return documents
+
+    def update(self, key, changes):
+        # Remplace un document existant par une version modifiée, y compris sur sa clé
+        # primaire ; renvoie la nouvelle version, ou None si le document n'existe pas
+        key = str(key)
+        with self.locked(key):
+            current = self.documents.get(key)
+            if current is None:
+                return None
+            document = {**current, **changes}
+            new_key = str(document.get(self.key))
+            if new_key == key:
+                return self.put(document)
+        # Changement de clé primaire : suppression et insertion journalisées ensemble
+        with self.locked(key, new_key):
+            if self.documents.get(key) is not current:
+                return self.update(key, changes)
+            with self.lock.write():
+                self._remove(key)
+                self._put(document)
+            if self.journal:
+                self.journal.append([{"op": "del", "key": key}, {"op": "put", "doc": document}])
+        return document
+
+    def delete(self, key):
+        # Supprime un document et ses entrées d'index ; renvoie le document supprimé
+        key = str(key)
+        with self.locked(key):
+            with self.lock.write():
+                document = self._remove(key)
+            if document is not None and self.journal:
+                self.journal.delete(key)
+        return document
+
+    def _put(self, document, keep_sorted=True):
+        key = str(document.get(self.key))
+        if keep_sorted and key not in self.documents:
+            insort(self.sorted_keys, key)
+        self.documents[key] = document
+        self._index(key, keep_sorted)
+
+    def _remove(self, key):
+        document = self.documents.pop(key, None)
+        if document is not None:
+            del self.sorted_keys[bisect_right(self.sorted_keys, key) - 1]
+            for name in self.index_functions:
+                self._unindex(name, key, self.indexed_values[name].pop(key, []))
+        return document
+
+    def _index(self, key, keep_sorted=True):
+        document = self.documents[key]
+        for name, function in self.index_functions.items():
+            new_values = list(dict.fromkeys(function(document)))
+            old_values = self.indexed_values[name].get(key, [])
+            if new_values == old_values:
+                continue
+            # Ajout avant retrait : une valeur conservée ne disparaît jamais de l'index,
+            # même pour une lecture sans verrou (exists)
+            for value in new_values:
+                if keep_sorted and name in self.ranged and value not in self.indexes[name]:
+                    insort(self.sorted_values[name], value)
+                if name in self.ordered:
+                    bucket = self.indexes[name].setdefault(value, [])
+                    position = bisect_left(bucket, key)
+                    if position == len(bucket) or bucket[position] != key:
+                        bucket.insert(position, key)
+                else:
+                    self.indexes[name].setdefault(value, {})[key] = True
+            kept = set(new_values)
+            self._unindex(name, key, [value for value in old_values if value not in kept])
+            self.indexed_values[name][key] = new_values
+
+    def _unindex(self, name, key, values):
+        index = self.indexes[name]
+        for value in values:
+            bucket = index.get(value)
+            if bucket is None:
+                continue
+            if name in self.ordered:
+                position = bisect_left(bucket, key)
+                if position < len(bucket) and bucket[position] == key:
+                    del bucket[position]
+            else:
+                bucket.pop(key, None)
+            if not bucket:
+                del index[value]
+                if name in self.ranged:
+                    values = self.sorted_values[name]
+                    del values[bisect_left(values, value)]
+
+
+def key_range(keys, low, high, after, limit):
+    # Tranche d'une liste de clés triées : entre `low` et `high` (inclus), après `after`
+    start = 0 if low is None else bisect_left(keys, str(low))
+    if after is not None:
+        start = max(start, bisect_right(keys, str(after)))
+    end = len(keys) if high is None else bisect_right(keys, str(high))
+    if limit is not None:
+        end = min(end, start + limit)
+    return keys[start:end]
@@ -0,0 +1,332 @@
+# Traçage des requêtes entre services (contexte W3C traceparent).
+#
+# Chaque requête reçue ouvre une trace : l'identifiant de trace est repris de l'en-tête
+# `traceparent` s'il est présent, généré sinon. Les appels faits pendant la requête
+# sont enregistrés comme spans enfants du span de la requête :
+#   - "client" : appel à un autre service (ServiceClient / AsyncServiceClient), qui
+#                reçoit à son tour un `traceparent` et continue la même trace
+#   - "db"     : commande MongoDB (MongoCommandTracer)
+#
+# La réponse porte `X-Trace-Id` et un en-tête `Server-Timing` qui détaille le temps
+# passé dans le service, chez chaque service appelé et dans MongoDB. Les spans des
+# traces échantillonnées (TRACE_SAMPLE_RATIO) sont exportés en arrière-plan selon
+# TRACE_EXPORT : "file:<chemin>" (une ligne JSON par span) ou une URL http(s)
+# recevant des lots de spans en POST ; rien n'est exporté si la variable est vide.
+#
+#   python -m common.tracing collect --port 4318 --output traces.jsonl   # collecteur local
+#   python -m common.tracing summary traces.jsonl [trace_id]            # répartition par trace
+
+import argparse
+import contextvars
+import functools
+import json
+import os
+import queue
+import random
+import sys
+import threading
+import time
+from collections import defaultdict
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import requests
+from flask import g, request
+from pymongo import monitoring
+
+from common.metrics import Counter, registry, route_label
+
+TRACE_EXPORT = os.getenv("TRACE_EXPORT", "")
+TRACE_SAMPLE_RATIO = float(os.getenv("TRACE_SAMPLE_RATIO", "1.0"))
+TRACE_QUEUE_SIZE = int(os.getenv("TRACE_QUEUE_SIZE", "10000"))
+TRACE_BATCH_SIZE = int(os.getenv("TRACE_BATCH_SIZE", "256"))
+
+SPANS_DROPPED = registry.register(Counter(
+    "trace_spans_dropped_total", "Spans non exportés (file d'export pleine ou destination injoignable)"))
+
+# Trace de la requête en cours (thread ou tâche asyncio)
+current_trace = contextvars.ContextVar("current_trace", default=None)
+
+
+def new_id(size):
+    return f"{random.getrandbits(size * 8):0{size * 2}x}"
+
+
+def parse_traceparent(header):
+    # (trace_id, parent_id, échantillonné) d'un en-tête traceparent valide, sinon None
+    parts = (header or "").strip().split("-")
+    if len(parts) < 4 or len(parts[1]) != 32 or len(parts[2]) != 16 or len(parts[3]) != 2:
+        return None
+    try:
+        int(parts[1], 16), int(parts[2], 16)
+        flags = int(parts[3], 16)
+    except ValueError:
+        return None
+    if parts[1] == "0" * 32 or parts[2] == "0" * 16:
+        return None
+    return parts[1], parts[2], bool(flags & 1)
+
+
+class Trace:
+    # Span d'une requête reçue et spans enfants enregistrés pendant son traitement
+
+    def __init__(self, service, name, traceparent=None):
+        parent = parse_traceparent(traceparent)
+        if parent:
+            self.trace_id, self.parent_id, self.sampled = parent
+        else:
+            self.trace_id, self.parent_id = new_id(16), None
+            self.sampled = random.random() < TRACE_SAMPLE_RATIO
+        self.span_id = new_id(8)
+        self.service = service
+        self.name = name
+        self.started_at = time.time()
+        self.started = time.perf_counter()
+        self.spans = []
+        # Temps cumulé par catégorie (service appelé, "mongo"), pour Server-Timing
+        self.timings = defaultdict(float)
+        # Des spans peuvent être ajoutés depuis plusieurs threads (enrichment_executor)
+        self.lock = threading.Lock()
+
+    def traceparent(self, span_id):
+        return f"00-{self.trace_id}-{span_id}-{'01' if self.sampled else '00'}"
+
+    def add(self, kind, name, category, started, duration, span_id=None, **attributes):
+        # Enregistre un span enfant ; `started` est une valeur de time.perf_counter()
+        span = self.sampled and self.span(kind, name, span_id or new_id(8), self.span_id,
+                                          self.started_at + started - self.started, duration, attributes)
+        with self.lock:
+            self.timings[category] += duration
+            if span:
+                self.spans.append(span)
+
+    def span(self, kind, name, span_id, parent_id, start, duration, attributes):
+        return {
+            "trace_id": self.trace_id,
+            "span_id": span_id,
+            "parent_id": parent_id,
+            "service": self.service,
+            "kind": kind,
+            "name": name,
+            "start": start,
+            "duration_ms": round(duration * 1000, 3),
+            "attributes": attributes,
+        }
+
+    def finish(self, status):
+        # Termine le span de la requête, exporte la trace et renvoie l'en-tête Server-Timing
+        duration = time.perf_counter() - self.started
+        if self.sampled:
+            self.spans.append(self.span("server", self.name, self.span_id, self.parent_id,
+                                        self.started_at, duration, {"status": status}))
+            exporter.export(self.spans)
+        timings = [f"app;dur={duration * 1000:.1f}"]
+        timings += [f"{category};dur={total * 1000:.1f}" for category, total in self.timings.items()]
+        return ", ".join(timings)
+
+
+def outgoing_headers(headers):
+    # En-têtes d'un appel sortant, avec le traceparent d'un nouveau span ; (span_id, en-têtes)
+    trace = current_trace.get()
+    if trace is None:
+        return None, headers
+    span_id = new_id(8)
+    return span_id, {**(headers or {}), "traceparent": trace.traceparent(span_id)}
+
+
+def record_call(span_id, service, method, path, started, status):
+    # Span "client" d'un appel à un autre service (une tentative)
+    trace = current_trace.get()
+    if trace is not None and span_id is not None:
+        trace.add("client", f"{method} {service}", service, started, time.perf_counter() - started,
+                  span_id=span_id, path=path, status=status)
+
+
+def propagate(function):
+    # `function` exécutée avec la trace courante, par exemple dans un ThreadPoolExecutor
+    return functools.partial(contextvars.copy_context().run, function)
+
+
+class MongoCommandTracer(monitoring.CommandListener):
+    # À passer à MongoClient(event_listeners=[...]) : un span "db" par commande de la requête en cours
+
+    def started(self, event):
+        pass
+
+    def succeeded(self, event):
+        self.record(event, "ok")
+
+    def failed(self, event):
+        self.record(event, "error")
+
+    def record(self, event, outcome):
+        trace = current_trace.get()
+        if trace is not None:
+            duration = event.duration_micros / 1e6
+            trace.add("db", f"mongo {event.command_name}", "mongo", time.perf_counter() - duration, duration,
+                      database=event.database_name, outcome=outcome)
+
+
+class Exporter:
+    # Export des spans en arrière-plan : la requête ne fait qu'ajouter ses spans à une file bornée
+
+    def __init__(self, target):
+        self.target = target
+        self.queue = queue.Queue(maxsize=TRACE_QUEUE_SIZE)
+        self.thread = None
+        self.lock = threading.Lock()
+
+    def export(self, spans):
+        if not self.target:
+            return
+        if self.thread is None:
+            self.start()
+        try:
+            self.queue.put_nowait(spans)
+        except queue.Full:
+            SPANS_DROPPED.inc(amount=len(spans))
+
+    def start(self):
+        # Démarré à la première trace, donc dans chaque worker après le fork
+        with self.lock:
+            if self.thread is None:
+                self.thread = threading.Thread(target=self.run, name="trace-exporter", daemon=True)
+                self.thread.start()
+
+    def run(self):
+        session = requests.Session()
+        while True:
+            batch = self.queue.get()
+            while len(batch) < TRACE_BATCH_SIZE:
+                try:
+                    batch = batch + self.queue.get_nowait()
+                except queue.Empty:
+                    break
+            try:
+                self.write(session, batch)
+            except (OSError, requests.RequestException) as e:
+                SPANS_DROPPED.inc(amount=len(batch))
+                print(f"Export des traces impossible: {e}")
+
+    def write(self, session, batch):
+        if self.target.startswith("file:"):
+            with open(self.target[len("file:"):], "a") as log:
+                log.write("".join(json.dumps(span) + "\n" for span in batch))
+        else:
+            session.post(self.target, json=batch, timeout=2)
+
+
+exporter = Exporter(TRACE_EXPORT)
+
+
+def trace_requests(app, service):
+    # Ouvre une trace pour chaque requête reçue par `app` (Flask)
+
+    @app.before_request
+    def start_trace():
+        trace = Trace(service, f"{request.method} {route_label(request)}", request.headers.get("traceparent"))
+        g.trace_token = current_trace.set(trace)
+
+    @app.after_request
+    def finish_trace(response):
+        trace = current_trace.get()
+        if trace is not None:
+            response.headers["Server-Timing"] = trace.finish(response.status_code)
+            response.headers["X-Trace-Id"] = trace.trace_id
+        return response
+
+    @app.teardown_request
+    def clear_trace(exc=None):
+        token = g.pop("trace_token", None)
+        if token is not None:
+            current_trace.reset(token)
+
+
+def trace_requests_async(app, service):
+    # Équivalent de trace_requests pour une application Quart (booking_async) ; les tâches
+    # lancées pendant la requête (asyncio.gather) héritent de la trace
+    import quart
+
+    @app.before_request
+    async def start_trace():
+        req = quart.request
+        current_trace.set(Trace(service, f"{req.method} {route_label(req)}", req.headers.get("traceparent")))
+
+    @app.after_request
+    async def finish_trace(response):
+        trace = current_trace.get()
+        if trace is not None:
+            response.headers["Server-Timing"] = trace.finish(response.status_code)
+            response.headers["X-Trace-Id"] = trace.trace_id
+            current_trace.set(None)
+        return response
+
+
+# ============================================================================
+# OUTILS EN LIGNE DE COMMANDE
+# ============================================================================
+
+def collect(port, output):
+    # Collecteur local : enregistre les lots de spans reçus en POST, une ligne JSON par span
+    lock = threading.Lock()
+
+    class Handler(BaseHTTPRequestHandler):
+        def do_POST(self):
+            spans = json.loads(self.rfile.read(int(self.headers.get("Content-Length", 0))) or b"[]")
+            with lock, open(output, "a") as log:
+                log.write("".join(json.dumps(span) + "\n" for span in spans))
+            self.send_response(204)
+            self.end_headers()
+
+        def log_message(self, *args):
+            pass
+
+    print(f"Collecteur de traces sur le port {port}, spans écrits dans {output}")
+    ThreadingHTTPServer(("0.0.0.0", port), Handler).serve_forever()
+
+
+def summary(path, trace_id=None):
+    # Arbre des spans de chaque trace, avec la durée de chaque étape
+    traces = defaultdict(list)
+    with open(path) as log:
+        for line in log:
+            span = json.loads(line)
+            if trace_id is None or span["trace_id"] == trace_id:
+                traces[span["trace_id"]].append(span)
+
+    for current_id, spans in traces.items():
+        children = defaultdict(list)
+        ids = {span["span_id"] for span in spans}
+        for span in sorted(spans, key=lambda span: span["start"]):
+            children[span["parent_id"] if span["parent_id"] in ids else None].append(span)
+
+        print(f"trace {current_id}")
+
+        def show(span, depth):
+            print(f"{'  ' * depth}{span['duration_ms']:9.2f} ms  {span['service']:<9} {span['kind']:<6} {span['name']}")
+            for child in children[span["span_id"]]:
+                show(child, depth + 1)
+
+        for root in children[None]:
+            show(root, 1)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Outils de traçage")
+    commands = parser.add_subparsers(dest="command", required=True)
+    collect_parser = commands.add_parser("collect", help="collecteur HTTP local")
+    collect_parser.add_argument("--port", type=int, default=4318)
+    collect_parser.add_argument("--output", default="traces.jsonl")
+    summary_parser = commands.add_parser("summary", help="répartition du temps par trace")
+    summary_parser.add_argument("path")
+    summary_parser.add_argument("trace_id", nargs="?")
+    args = parser.parse_args()
+
+    if args.command == "collect":
+        collect(args.port, args.output)
+    else:
+        summary(args.path, args.trace_id)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
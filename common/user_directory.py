@@ -0,0 +1,146 @@
+# Consultation des utilisateurs (et de leur rôle) auprès du service User, avec cache.
+#
+# Les utilisateurs sont mis en cache USER_CACHE_TTL secondes. Le service User
+# notifie ses abonnés (USER_CHANGE_SUBSCRIBERS) à chaque modification d'un
+# utilisateur via POST /internal/users/<userid>/invalidate ; une entrée expirée
+# est revalidée par une requête conditionnelle (If-None-Match) sur son ETag.
+#
+# Les contrôles de droits (is_admin) sont servis par le cache, sans appel à User. La
+# notification n'atteint qu'un seul worker gunicorn : celui-ci l'ajoute au fichier
+# USER_INVALIDATION_FILE (créé par gunicorn_conf.py pour chaque lancement à plusieurs
+# workers), que chaque worker relit avant de consulter son cache (un os.stat, plus la
+# lecture des lignes nouvelles). Un administrateur rétrogradé perd donc ses droits dans
+# tous les workers dès la notification, et au plus tard après USER_CACHE_TTL si elle
+# s'est perdue. Si User est injoignable, le droit est refusé.
+
+import json
+import os
+import threading
+from urllib.parse import quote
+
+import httpx
+import requests
+
+from common.cache import TTLCache
+
+USER_CACHE_TTL = float(os.getenv("USER_CACHE_TTL", "30"))
+USER_CACHE_SIZE = int(os.getenv("USER_CACHE_SIZE", "1024"))
+USER_INVALIDATION_FILE = os.getenv("USER_INVALIDATION_FILE", "")
+
+
+class InvalidationLog:
+    # Fichier d'invalidations partagé par les workers d'un même lancement : une ligne JSON
+    # par utilisateur modifié, ajoutée en une seule écriture (O_APPEND). Chaque worker
+    # retient la position déjà lue ; les lignes antérieures à son démarrage sont ignorées,
+    # son cache étant alors vide
+
+    def __init__(self, path):
+        self.path = path
+        self.offset = self.size()
+        self.lock = threading.Lock()
+
+    def size(self):
+        try:
+            return os.stat(self.path).st_size
+        except FileNotFoundError:
+            return 0
+
+    def publish(self, userid):
+        with open(self.path, "a", encoding="utf-8") as log:
+            log.write(json.dumps(userid) + "\n")
+
+    def read_new(self):
+        # Utilisateurs invalidés par les autres workers depuis la dernière lecture
+        size = self.size()
+        if size == self.offset:
+            return []
+        with self.lock:
+            if size < self.offset:
+                # Fichier recréé : relu depuis le début
+                self.offset = 0
+            with open(self.path, "rb") as log:
+                log.seek(self.offset)
+                data = log.read(size - self.offset)
+            # Seules les lignes complètes sont lues, une écriture en cours le sera au prochain appel
+            end = data.rfind(b"\n") + 1
+            self.offset += end
+        return [json.loads(line) for line in data[:end].splitlines()]
+
+
+class UserDirectory:
+
+    def __init__(self, client, ttl=USER_CACHE_TTL, maxsize=USER_CACHE_SIZE, invalidation_file=USER_INVALIDATION_FILE):
+        self.client = client
+        self.cache = TTLCache(maxsize, ttl)
+        self.invalidations = InvalidationLog(invalidation_file) if invalidation_file else None
+
+    def get(self, userid):
+        # Utilisateur ou None s'il n'existe pas ; None également si User est injoignable (non mis en cache)
+        entry = self.cached_entry(userid)
+        if entry is not None and not entry[1]:
+            return entry[0][1]
+
+        generation = self.cache.generation
+        try:
+            response = self.client.get(self.path(userid), headers=self.conditional_headers(entry))
+        except requests.RequestException:
+            return None
+        return self.store(userid, entry, response, generation)
+
+    def is_admin(self, userid):
+        user = self.get(userid)
+        return bool(user) and user.get("role") == "admin"
+
+    def invalidate(self, userid):
+        # Notification de User : vide l'entrée de ce worker et la signale aux autres
+        self.cache.invalidate(userid)
+        if self.invalidations:
+            self.invalidations.publish(userid)
+
+    def cached_entry(self, userid):
+        # Entrée du cache, après application des invalidations reçues par les autres workers
+        if self.invalidations:
+            for invalidated in self.invalidations.read_new():
+                self.cache.invalidate(invalidated)
+        return self.cache.entry(userid)
+
+    def path(self, userid):
+        return f"/users/{quote(userid, safe='')}"
+
+    def conditional_headers(self, entry):
+        if entry is not None and entry[0][0]:
+            return {"If-None-Match": entry[0][0]}
+        return {}
+
+    def store(self, userid, entry, response, generation):
+        # Met en cache la réponse de User et renvoie l'utilisateur correspondant
+        if response.status_code == 304:
+            etag, user = entry[0]
+        elif response.status_code == 200:
+            etag, user = response.headers.get("ETag"), response.json()
+        elif response.status_code == 404:
+            etag, user = None, None
+        else:
+            return None
+        self.cache.set(userid, (etag, user), generation)
+        return user
+
+
+class AsyncUserDirectory(UserDirectory):
+    # Même cache, interrogé avec un AsyncServiceClient
+
+    async def get(self, userid):
+        entry = self.cached_entry(userid)
+        if entry is not None and not entry[1]:
+            return entry[0][1]
+
+        generation = self.cache.generation
+        try:
+            response = await self.client.get(self.path(userid), headers=self.conditional_headers(entry))
+        except httpx.HTTPError:
+            return None
+        return self.store(userid, entry, response, generation)
+
+    async def is_admin(self, userid):
+        user = await self.get(userid)
+        return bool(user) and user.get("role") == "admin"
@@ -0,0 +1,172 @@
+# Places des séances (film, date) : capacité et places restantes, retirées à chaque
+# réservation et rendues à chaque annulation (routes /schedule/.../seats).
+#
+# Une séance sans compteur a toute sa capacité (SCREENING_CAPACITY) : le compteur est
+# créé à la première réservation ou au premier changement de capacité. Les deux
+# implémentations ont la même interface (get, reserve, release, set_capacity, delete, delete_many) :
+#   - MongoSeats : collection `seats`, une réservation est un $inc conditionnel atomique
+#     ({available: {$gte: n}}) ; jamais de survente, sans verrou ni transaction
+#   - JsonSeats  : compteurs en mémoire, chacun modifié sous un verrou réparti par séance ;
+#     l'entrée du journal est écrite sous ce verrou (les versions d'un compteur restent
+#     dans l'ordre) mais le fsync est attendu après, partagé entre réservations concurrentes
+
+import os
+
+from pymongo import ASCENDING, IndexModel, ReturnDocument
+from pymongo.errors import DuplicateKeyError
+
+from common.locks import StripedLock
+
+SCREENING_CAPACITY = int(os.getenv("SCREENING_CAPACITY", "100"))
+
+SEATS_COLLECTION = "seats"
+SEAT_INDEXES = [
+    IndexModel([("movieid", ASCENDING), ("date", ASCENDING)], unique=True, name="screening_unique"),
+]
+FIELDS = ("movieid", "date", "capacity", "available")
+
+
+def screening_key(movieid, date):
+    return f"{date}/{movieid}"
+
+
+def new_counter(movieid, date, capacity=SCREENING_CAPACITY):
+    return {"movieid": movieid, "date": date, "capacity": capacity, "available": capacity}
+
+
+def seats_view(counter):
+    # Compteur tel que renvoyé par l'API
+    return {field: counter[field] for field in FIELDS}
+
+
+class JsonSeats:
+
+    def __init__(self, stripes=64):
+        self.counters = {}
+        self.locks = StripedLock(stripes)
+        self.journal = None
+
+    def open(self, journal):
+        # Charge les compteurs persistés et y enregistre les modifications suivantes
+        self.journal = journal
+        self.counters = {counter["screening"]: counter for counter in journal.load()}
+
+    def get(self, movieid, date):
+        return self.counters.get(screening_key(movieid, date)) or new_counter(movieid, date)
+
+    def reserve(self, movieid, date, seats):
+        # Retire `seats` places ; compteur mis à jour, ou None s'il n'en reste pas assez
+        return self._change(movieid, date, lambda counter: None if counter["available"] < seats else {
+            **counter, "available": counter["available"] - seats
+        })
+
+    def release(self, movieid, date, seats):
+        # Rend `seats` places, sans dépasser la capacité
+        return self._change(movieid, date, lambda counter: {
+            **counter, "available": min(counter["capacity"], counter["available"] + seats)
+        })
+
+    def set_capacity(self, movieid, date, capacity):
+        # Nouvelle capacité, les places déjà réservées restant réservées ; None si la
+        # capacité demandée est inférieure à ces places
+        def resize(counter):
+            reserved = counter["capacity"] - counter["available"]
+            if capacity < reserved:
+                return None
+            return {**counter, "capacity": capacity, "available": capacity - reserved}
+        return self._change(movieid, date, resize)
+
+    def delete(self, movieid, date):
+        key = screening_key(movieid, date)
+        seq = None
+        with self.locks.locked(key):
+            if self.counters.pop(key, None) is not None and self.journal:
+                seq = self.journal.append([{"op": "del", "key": key}], wait=False)
+        if seq is not None:
+            self.journal.wait(seq)
+
+    def delete_many(self, movieids, date):
+        for movieid in movieids:
+            self.delete(movieid, date)
+
+    def _change(self, movieid, date, change):
+        key = screening_key(movieid, date)
+        seq = None
+        with self.locks.locked(key):
+            counter = change(self.counters.get(key) or {"screening": key, **new_counter(movieid, date)})
+            if counter is None:
+                return None
+            self.counters[key] = counter
+            if self.journal:
+                seq = self.journal.append([{"op": "put", "doc": counter}], wait=False)
+        if seq is not None:
+            self.journal.wait(seq)
+        return counter
+
+
+class MongoSeats:
+
+    def __init__(self, collection):
+        self.collection = collection
+
+    def get(self, movieid, date):
+        return self.collection.find_one({"movieid": movieid, "date": date}, {"_id": 0}) or new_counter(movieid, date)
+
+    def reserve(self, movieid, date, seats):
+        for _ in range(2):
+            counter = self.collection.find_one_and_update(
+                {"movieid": movieid, "date": date, "available": {"$gte": seats}},
+                {"$inc": {"available": -seats}},
+                projection={"_id": 0},
+                return_document=ReturnDocument.AFTER
+            )
+            if counter is not None:
+                return counter
+            if self.collection.count_documents({"movieid": movieid, "date": date}, limit=1):
+                return None
+            # Première réservation de la séance : création du compteur, puis nouvel essai
+            self.create(movieid, date, SCREENING_CAPACITY)
+        return None
+
+    def release(self, movieid, date, seats):
+        counter = self.collection.find_one_and_update(
+            {"movieid": movieid, "date": date},
+            [{"$set": {"available": {"$min": ["$capacity", {"$add": ["$available", seats]}]}}}],
+            projection={"_id": 0},
+            return_document=ReturnDocument.AFTER
+        )
+        return counter or new_counter(movieid, date)
+
+    def set_capacity(self, movieid, date, capacity):
+        for _ in range(2):
+            counter = self.collection.find_one_and_update(
+                {"movieid": movieid, "date": date,
+                 "$expr": {"$lte": [{"$subtract": ["$capacity", "$available"]}, capacity]}},
+                [{"$set": {
+                    "available": {"$add": ["$available", {"$subtract": [capacity, "$capacity"]}]},
+                    "capacity": capacity,
+                }}],
+                projection={"_id": 0},
+                return_document=ReturnDocument.AFTER
+            )
+            if counter is not None:
+                return counter
+            if self.collection.count_documents({"movieid": movieid, "date": date}, limit=1):
+                return None
+            if self.create(movieid, date, capacity):
+                return new_counter(movieid, date, capacity)
+        return None
+
+    def delete(self, movieid, date):
+        self.collection.delete_one({"movieid": movieid, "date": date})
+
+    def delete_many(self, movieids, date):
+        self.collection.delete_many({"movieid": {"$in": list(movieids)}, "date": date})
+
+    def create(self, movieid, date, capacity):
+        # Crée le compteur d'une séance ; False s'il a été créé entre-temps par une requête concurrente
+        try:
+            self.collection.insert_one(new_counter(movieid, date, capacity))
+            return True
+        except DuplicateKeyError:
+            return False